@@ -0,0 +1,75 @@
+"""
+Import-time benchmark for the app's modules.
+
+Usage:
+    python bench_imports.py --runs 5 --budget-ms 300
+
+Each module is imported in a fresh interpreter (cold, like a new container) and
+the median time is reported. Fails if a module pulls in a heavy library at import
+time (they must load lazily on first use) or exceeds the budget.
+"""
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+MODULES = [
+    "prompts",
+    "llm_engine",
+    "voice_engine",
+    "downloader",
+    "jobs",
+    "media_library",
+    "media_server",
+    "video_engine",
+    "pipeline",
+]
+
+# Libraries that must only be imported when a feature is used
+HEAVY_MODULES = ["google.generativeai", "moviepy", "edge_tts", "yt_dlp", "imageio_ffmpeg", "proglog"]
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def measure(module, runs):
+    """Returns (median seconds, heavy modules loaded) for importing module in fresh interpreters."""
+    times = []
+    loaded = set()
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"Importing {module} failed: {result.stderr.strip()}")
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        times.append(data["seconds"])
+        loaded.update(data["loaded"])
+    return statistics.median(times), sorted(loaded)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of the app modules.")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if any module takes longer")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.modules:
+        seconds, loaded = measure(module, args.runs)
+        status = "ok"
+        if loaded:
+            status = f"EAGER: {', '.join(loaded)}"
+            failed = True
+        elif args.budget_ms is not None and seconds * 1000 > args.budget_ms:
+            status = "OVER BUDGET"
+            failed = True
+        print(f"{module:<16} {seconds * 1000:8.1f} ms  {status}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Soak test for MoviePy reader cleanup in video_engine.
+
+Usage:
+    python bench_soak.py --renders 300 --pool-size 4
+
+Runs hundreds of small renders in one process, alternating MoviePy slideshow
+renders (voiceover opened through open_clip) with clip reader leases, and samples
+child processes, open file descriptors and RSS. After a warm-up, all three must
+stay flat; a leaked reader shows up as an extra ffmpeg child and open pipes.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import ffmpeg_tools
+import video_engine
+
+def _make_media(work_dir):
+    """Generates a still, a short voiceover and a short H.264 clip with ffmpeg's test sources."""
+    image_path = os.path.join(work_dir, "still.png")
+    audio_path = os.path.join(work_dir, "voice.m4a")
+    clip_path = os.path.join(work_dir, "clip.mp4")
+    ffmpeg_tools.run_ffmpeg(["-f", "lavfi", "-i", "color=c=red:s=320x240", "-frames:v", "1", image_path])
+    ffmpeg_tools.run_ffmpeg(["-f", "lavfi", "-i", "sine=frequency=440:duration=2", "-c:a", "aac", audio_path])
+    ffmpeg_tools.run_ffmpeg(["-f", "lavfi", "-i", "testsrc=size=320x240:rate=24", "-t", "2",
+                             "-c:v", "libx264", "-pix_fmt", "yuv420p", clip_path])
+    return image_path, audio_path, clip_path
+
+def _proc_children(pid):
+    count = 0
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # ppid is the 2nd field after the parenthesized command name
+                if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                    count += 1
+        except (OSError, IndexError, ValueError):
+            continue
+    return count
+
+def sample():
+    """Returns (child processes, open fds/handles, RSS in MB) for this process."""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil:
+        proc = psutil.Process()
+        fds = proc.num_fds() if hasattr(proc, "num_fds") else proc.num_handles()
+        return len(proc.children()), fds, proc.memory_info().rss / (1024 * 1024)
+    # Linux without psutil
+    with open("/proc/self/status", "r") as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    return _proc_children(os.getpid()), len(os.listdir("/proc/self/fd")), rss_kb / 1024
+
+def render_once(i, image_path, audio_path, clip_path):
+    if i % 2 == 0:
+        video_engine.create_video([image_path], audio_path, "soak_slideshow", use_ffmpeg=False, profile="draft")
+    else:
+        with video_engine.open_clip("video", clip_path) as clip, video_engine.open_clip("audio", audio_path) as audio:
+            clip.get_frame(clip.duration / 2)
+            audio.get_frame(audio.duration / 2)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that repeated renders don't leak readers, fds or memory.")
+    parser.add_argument("--renders", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=10, help="Renders before the baseline sample")
+    parser.add_argument("--sample-every", type=int, default=50)
+    parser.add_argument("--pool-size", type=int, default=0, help="READER_POOL_SIZE to test (0 = no pooling)")
+    parser.add_argument("--max-fd-growth", type=int, default=4)
+    parser.add_argument("--max-rss-growth-mb", type=float, default=64)
+    args = parser.parse_args(argv)
+
+    video_engine.READER_POOL_SIZE = args.pool_size
+    work_dir = tempfile.mkdtemp(prefix="soak-")
+    try:
+        media = _make_media(work_dir)
+        start = time.time()
+        baseline = None
+        for i in range(args.renders):
+            render_once(i, *media)
+            done = i + 1
+            if done == args.warmup:
+                baseline = sample()
+                print(f"baseline after {done:4d}: children={baseline[0]} fds={baseline[1]} rss={baseline[2]:.1f} MB")
+            elif baseline and done % args.sample_every == 0:
+                children, fds, rss = sample()
+                print(f"after {done:4d} renders: children={children} fds={fds} rss={rss:.1f} MB "
+                      f"({(time.time() - start) / done:.2f} s/render)")
+        children, fds, rss = sample()
+    finally:
+        if args.pool_size:
+            video_engine.get_reader_pool().close_all()
+        shutil.rmtree(work_dir, ignore_errors=True)
+        soak_output = os.path.join("content/videos", "soak_slideshow.mp4")
+        if os.path.exists(soak_output):
+            os.remove(soak_output)
+
+    if baseline is None:
+        print("Not enough renders for a baseline; increase --renders.")
+        return 1
+    problems = []
+    if children > baseline[0]:
+        problems.append(f"child processes grew {baseline[0]} -> {children}")
+    if fds - baseline[1] > args.max_fd_growth:
+        problems.append(f"open fds grew {baseline[1]} -> {fds}")
+    if rss - baseline[2] > args.max_rss_growth_mb:
+        problems.append(f"RSS grew {baseline[2]:.1f} -> {rss:.1f} MB")
+    for problem in problems:
+        print(f"LEAK: {problem}")
+    if not problems:
+        print(f"ok: {args.renders} renders, children/fds/RSS flat")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
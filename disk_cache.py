@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import hashlib
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+def _lock_file(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(0.1)
+
+def _unlock_file(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def make_key(*parts):
+    """Builds a stable cache key (sha256 hex) from any JSON-serializable parts."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class DiskCache:
+    """
+    Content-addressed file cache with a sqlite manifest and size-bounded LRU eviction.
+    Each entry is a single file stored as <root>/<key><suffix>. Manifest updates run
+    in sqlite write transactions, so render worker processes can share one cache.
+    """
+
+    INDEX_NAME = "index.sqlite"
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, self.INDEX_NAME)
+        if not os.path.exists(root):
+            os.makedirs(root, exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    file TEXT,
+                    size INTEGER,
+                    created REAL,
+                    last_access REAL,
+                    meta TEXT
+                )
+            """)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Yields a connection inside an IMMEDIATE transaction (one writer across processes)."""
+        conn = sqlite3.connect(self.index_path, timeout=60, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """
+        Holds an exclusive lock on key across threads and processes (a <key>.lock file
+        in the cache root), so concurrent requests for one entry build it only once.
+        """
+        path = os.path.join(self.root, f"{key}.lock")
+        while True:
+            f = open(path, "a+b")
+            try:
+                _lock_file(f)
+                # The previous holder removes the file before unlocking it; a lock on a
+                # file that is no longer at path doesn't count, so open the new one
+                held = os.path.samestat(os.fstat(f.fileno()), os.stat(path))
+            except FileNotFoundError:
+                held = False
+            except BaseException:
+                f.close()
+                raise
+            if held:
+                break
+            f.close()
+        try:
+            yield
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                # Windows can't remove an open file; the next holder reuses it
+                pass
+            _unlock_file(f)
+            f.close()
+
+    def temp_path(self, suffix=""):
+        """Returns a unique path inside the cache root for writing a new entry."""
+        return os.path.join(self.root, f".tmp-{uuid.uuid4().hex}{suffix}")
+
+    def get(self, key):
+        """Returns the cached file path for key (and marks it as recently used), or None."""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT file FROM entries WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            path = os.path.join(self.root, row[0])
+            if not os.path.exists(path):
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            return path
+
+    def get_meta(self, key):
+        """Returns the meta dict stored with key by put(), or None."""
+        conn = sqlite3.connect(self.index_path, timeout=60)
+        try:
+            row = conn.execute("SELECT meta FROM entries WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def put(self, key, src_path, suffix="", move=False, meta=None):
+        """
+        Stores src_path under key and returns the cached path.
+        With move=True the source file is renamed into the cache instead of copied.
+        """
+        filename = f"{key}{suffix}"
+        final_path = os.path.join(self.root, filename)
+
+        if move:
+            os.replace(src_path, final_path)
+        else:
+            tmp_path = self.temp_path(suffix)
+            shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, final_path)
+
+        with self._transaction() as conn:
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, file, size, created, last_access, meta) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, filename, os.path.getsize(final_path), now, now, json.dumps(meta) if meta else None),
+            )
+            self._evict(conn, keep=key)
+        return final_path
+
+    def _evict(self, conn, keep=None):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute("SELECT key, file, size FROM entries ORDER BY last_access").fetchall()
+        for key, filename, size in rows:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size or 0
+            try:
+                os.remove(os.path.join(self.root, filename))
+            except OSError:
+                pass
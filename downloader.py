@@ -1,51 +1,97 @@
-import yt_dlp
 import os
-import imageio_ffmpeg
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+import ffmpeg_tools
+from disk_cache import DiskCache, make_key
+
+# Downloaded clips are cached by (video id, start, duration, format selector)
+CLIP_CACHE_DIR = os.environ.get("CLIP_CACHE_DIR", "content/cache/clips")
+CLIP_CACHE_MAX_MB = int(os.environ.get("CLIP_CACHE_MAX_MB", "2000"))
+
+# Preferred format: Single file mp4 if possible, fallback to best quality
+# We avoid the '+' operator to prevent merging errors if ffprobe is missing
+CLIP_FORMAT = 'best[ext=mp4][height<=720]/best[height<=720]/best'
+
+# Full source videos are kept so further clips can be cut locally
+SOURCE_CACHE_DIR = os.environ.get("SOURCE_CACHE_DIR", "content/cache/sources")
+SOURCE_CACHE_MAX_MB = int(os.environ.get("SOURCE_CACHE_MAX_MB", "10000"))
+
+# Search results: in-memory LRU plus an optional sqlite file (set SEARCH_CACHE_DB="" to disable)
+SEARCH_CACHE_DB = os.environ.get("SEARCH_CACHE_DB", "content/cache/search.sqlite")
+SEARCH_CACHE_TTL = int(os.environ.get("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", "256"))
+
+_clip_cache = None
+_source_cache = None
+
+def get_clip_cache():
+    global _clip_cache
+    if _clip_cache is None:
+        _clip_cache = DiskCache(CLIP_CACHE_DIR, CLIP_CACHE_MAX_MB * 1024 * 1024)
+    return _clip_cache
+
+def get_source_cache():
+    global _source_cache
+    if _source_cache is None:
+        _source_cache = DiskCache(SOURCE_CACHE_DIR, SOURCE_CACHE_MAX_MB * 1024 * 1024)
+    return _source_cache
+
+def get_video_id(url):
+    """Extracts the YouTube video id from common URL forms (falls back to the URL itself)."""
+    match = re.search(r"(?:v=|youtu\.be/|/shorts/|/embed/|/live/)([\w-]{11})", url)
+    if match:
+        return match.group(1)
+    return url.strip()
 
 def download_video_clip(url, output_filename, start_time=0, duration=10):
     """
     Downloads a specific clip from a YouTube URL.
+    Clips are served from a shared on-disk cache, so repeated requests cost no network
+    time. output_filename is only used to label the temporary download.
     """
-    output_dir = "content/clips"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        
-    output_path = os.path.join(output_dir, f"{output_filename}.mp4")
-    ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
-    ffmpeg_dir = os.path.dirname(ffmpeg_exe)
-    
-    # Create a local 'bin' directory and symlink/copy ffmpeg.exe if it doesn't exist
-    # This helps yt-dlp and other tools that look for 'ffmpeg.exe' specifically
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    local_bin = os.path.join(base_dir, "bin")
-    if not os.path.exists(local_bin):
-        os.makedirs(local_bin)
-    
-    local_ffmpeg = os.path.join(local_bin, "ffmpeg.exe")
-    if not os.path.exists(local_ffmpeg):
-        import shutil
+    cache = get_clip_cache()
+    key = make_key("clip", get_video_id(url), float(start_time), float(duration), CLIP_FORMAT)
+
+    # Render workers are separate processes, so identical requests are serialized on a lock file
+    with cache.lock(key):
+        cached_path = cache.get(key)
+        if cached_path:
+            return cached_path
+        tmp_path = cache.temp_path(f"-{output_filename}.mp4")
         try:
-            shutil.copy2(ffmpeg_exe, local_ffmpeg)
+            source_path = get_source_cache().get(_source_key(url))
+            if source_path:
+                # Full video already on disk: cut locally instead of hitting the network
+                clip_path = extract_clip(source_path, tmp_path, start_time, duration)
+            else:
+                clip_path = _download_clip_uncached(url, tmp_path, start_time, duration)
         except Exception:
-            pass # Fallback to path modification if copy fails
-            
-    if local_bin not in os.environ["PATH"]:
-        os.environ["PATH"] = local_bin + os.pathsep + os.environ["PATH"]
-    
-    # Preferred format: Single file mp4 if possible, fallback to best quality
-    # We avoid the '+' operator to prevent merging errors if ffprobe is missing
-    format_str = 'best[ext=mp4][height<=720]/best[height<=720]/best'
-    
+            for leftover in (tmp_path, tmp_path + ".part"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+        return cache.put(key, clip_path, suffix=".mp4", move=True,
+                         meta={"url": url, "start_time": start_time, "duration": duration})
+
+def _download_clip_uncached(url, output_path, start_time, duration):
+    """
+    Downloads the clip to output_path (a unique temp path).
+    """
+    import yt_dlp
     ydl_opts = {
-        'format': format_str,
+        'format': CLIP_FORMAT,
         'outtmpl': output_path,
         'merge_output_format': 'mp4',
         'download_ranges': lambda info_dict, ydl: [{'start_time': start_time, 'end_time': start_time + duration}],
         'force_keyframes_at_cuts': True,
-        'ffmpeg_location': local_bin, # Use the directory path
         'quiet': True,
         'no_warnings': True,
     }
+    ydl_opts.update(ffmpeg_tools.get_ytdlp_options())
     
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
@@ -53,56 +99,177 @@ def download_video_clip(url, output_filename, start_time=0, duration=10):
         return output_path
     except Exception as e:
         print(f"Partial download failed: {e}. Trying full download and local clip...")
-        # Fallback: Download full and clip locally
-        full_video_path = os.path.join(output_dir, f"{output_filename}_full.mp4")
+        # Fallback: Download full (kept in the source store) and clip locally
+        try:
+            source_path = download_source(url)
+            return extract_clip(source_path, output_path, start_time, duration)
+        except Exception as fallback_e:
+            error_msg = f"Error downloading YouTube clip: {fallback_e}"
+            print(error_msg)
+            raise Exception(error_msg)
+
+def _source_key(url):
+    return make_key("source", get_video_id(url), CLIP_FORMAT)
+
+def download_source(url):
+    """
+    Downloads the full video into the source store (or returns the stored copy).
+    """
+    import yt_dlp
+    cache = get_source_cache()
+    key = _source_key(url)
+    with cache.lock(key):
+        cached_path = cache.get(key)
+        if cached_path:
+            return cached_path
+        tmp_path = cache.temp_path(".mp4")
         ydl_opts_full = {
-            'format': 'best[ext=mp4][height<=720]/best[height<=720]/best',
-            'outtmpl': full_video_path,
+            'format': CLIP_FORMAT,
+            'outtmpl': tmp_path,
             'quiet': True,
         }
+        ydl_opts_full.update(ffmpeg_tools.get_ytdlp_options())
         try:
             with yt_dlp.YoutubeDL(ydl_opts_full) as ydl:
                 ydl.download([url])
-            
-            # Clip with moviepy
-            from moviepy import VideoFileClip
-            video = VideoFileClip(full_video_path)
-            clip = video.subclipped(start_time, start_time + duration)
-            clip.write_videofile(output_path, codec="libx264", audio_codec="aac")
-            video.close()
-            clip.close()
-            
-            # Remove full video
-            if os.path.exists(full_video_path):
-                os.remove(full_video_path)
-                
-            return output_path
-        except Exception as fallback_e:
-            error_msg = f"Error downloading YouTube clip: {fallback_e}"
-            print(error_msg)
-            raise Exception(error_msg)
+        except Exception:
+            for leftover in (tmp_path, tmp_path + ".part"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+        return cache.put(key, tmp_path, suffix=".mp4", move=True, meta={"url": url})
 
-def search_youtube_links(query, max_results=3):
+def extract_clip(source_path, output_path, start_time=0, duration=10, accurate=False):
     """
-    Searches for YouTube videos based on a query.
+    Cuts a clip from a local video with ffmpeg.
+    H.264 sources are stream-copied from the nearest keyframe; other codecs (or
+    accurate=True) are fast-seeked and re-encoded for just the clip range.
+    """
+    if not accurate:
+        info = ffmpeg_tools.probe_media(source_path)
+        accurate = info["video_codec"] != "h264"
+    return ffmpeg_tools.cut_media(source_path, output_path, start_time, duration, accurate=accurate)
+
+def _ytdlp_search(query, start, count):
+    """
+    Runs a flat 'ytsearch' extraction and returns results start..start+count-1.
     Note: Standard yt-dlp doesn't have a direct search-then-return-urls API easily,
     so we use the 'ytsearch' prefix.
     """
+    import yt_dlp
     ydl_opts = {
         'format': 'best',
         'quiet': True,
         'no_warnings': True,
         'extract_flat': True,
+        # Only the new page is returned; earlier results are already cached
+        'playliststart': start + 1,
+        'playlistend': start + count,
     }
     
-    search_query = f"ytsearch{max_results}:{query}"
+    search_query = f"ytsearch{start + count}:{query}"
+    
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        result = ydl.extract_info(search_query, download=False)
+        if 'entries' in result:
+            return [{"title": entry['title'], "url": f"https://www.youtube.com/watch?v={entry['id']}"} for entry in result['entries']]
+        return []
+
+class SearchCache:
+    """
+    TTL'd, size-bounded cache of search results, in memory plus an optional sqlite file.
+    Results accumulate per normalized query so later pages extend earlier ones.
+    """
+
+    def __init__(self, db_path=None, ttl=3600, max_entries=256):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if db_path:
+            db_dir = os.path.dirname(db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS search (query TEXT PRIMARY KEY, results TEXT, created REAL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    @staticmethod
+    def normalize(query):
+        return " ".join(query.lower().split())
+
+    def get(self, query):
+        key = self.normalize(query)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._memory.move_to_end(key)
+                return list(entry[1])
+        if self.db_path:
+            with self._connect() as conn:
+                row = conn.execute("SELECT results, created FROM search WHERE query = ?", (key,)).fetchone()
+            if row and now - row[1] < self.ttl:
+                results = json.loads(row[0])
+                self._remember(key, results, row[1])
+                return results
+        return None
+
+    def put(self, query, results):
+        key = self.normalize(query)
+        created = time.time()
+        self._remember(key, results, created)
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO search (query, results, created) VALUES (?, ?, ?)",
+                             (key, json.dumps(results), created))
+                conn.execute("DELETE FROM search WHERE created < ?", (created - self.ttl,))
+
+    def _remember(self, key, results, created):
+        with self._lock:
+            self._memory[key] = (created, list(results))
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+_search_cache = None
+
+def get_search_cache():
+    global _search_cache
+    if _search_cache is None:
+        _search_cache = SearchCache(SEARCH_CACHE_DB or None, SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES)
+    return _search_cache
+
+def search_youtube_links(query, max_results=3, extractor=None, use_cache=True):
+    """
+    Searches for YouTube videos based on a query.
+    Results are cached per normalized query; asking for more results only fetches
+    the missing ones. `extractor(query, start, count)` can replace yt-dlp (e.g. offline fakes).
+    """
+    extractor = extractor or _ytdlp_search
+    cache = get_search_cache() if use_cache else None
+    
+    results = (cache.get(query) if cache else None) or []
+    if len(results) >= max_results:
+        return results[:max_results]
     
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            result = ydl.extract_info(search_query, download=False)
-            if 'entries' in result:
-                return [{"title": entry['title'], "url": f"https://www.youtube.com/watch?v={entry['id']}"} for entry in result['entries']]
-            return []
+        more = extractor(query, len(results), max_results - len(results))
     except Exception as e:
         print(f"Error searching YouTube: {e}")
-        return []
+        return results[:max_results]
+    
+    results = results + more
+    if cache and more:
+        cache.put(query, results)
+    return results[:max_results]
+
+def search_youtube_page(query, page=0, page_size=3, extractor=None, use_cache=True):
+    """
+    Returns one page of search results, reusing the pages fetched before it.
+    """
+    results = search_youtube_links(query, (page + 1) * page_size, extractor=extractor, use_cache=use_cache)
+    return results[page * page_size:(page + 1) * page_size]
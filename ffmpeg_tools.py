@@ -0,0 +1,281 @@
+import os
+import re
+import tempfile
+import subprocess
+import threading
+
+_resolve_lock = threading.Lock()
+_ffmpeg_exe = None
+_capabilities = None
+
+def get_ffmpeg_exe():
+    """
+    Returns the ffmpeg binary path, resolved once per process.
+    FFMPEG_BINARY overrides the binary bundled with imageio_ffmpeg.
+    """
+    global _ffmpeg_exe
+    if _ffmpeg_exe is None:
+        with _resolve_lock:
+            if _ffmpeg_exe is None:
+                override = os.environ.get("FFMPEG_BINARY")
+                if override and override != "ffmpeg-imageio" and os.path.exists(override):
+                    _ffmpeg_exe = override
+                else:
+                    import imageio_ffmpeg
+                    _ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
+    return _ffmpeg_exe
+
+def get_ytdlp_options():
+    """
+    Options that point yt-dlp at our ffmpeg explicitly (no PATH edits or binary copies).
+    yt-dlp accepts a binary path whose name contains 'ffmpeg'.
+    """
+    return {'ffmpeg_location': get_ffmpeg_exe()}
+
+def configure_moviepy():
+    """
+    Points MoviePy/imageio at the resolved binary. Must run before moviepy is imported;
+    only sets variables that are not already configured.
+    """
+    exe = get_ffmpeg_exe()
+    os.environ.setdefault("FFMPEG_BINARY", exe)
+    os.environ.setdefault("IMAGEIO_FFMPEG_EXE", exe)
+    return exe
+
+def _list_output(flag):
+    result = subprocess.run([get_ffmpeg_exe(), "-hide_banner", flag], capture_output=True, text=True)
+    return result.stdout.splitlines()
+
+def get_capabilities():
+    """
+    Returns (and caches) what the ffmpeg build supports:
+    {'version': str, 'encoders': set, 'hwaccels': set, 'filters': set}
+    """
+    global _capabilities
+    if _capabilities is None:
+        version_lines = _list_output("-version")
+        version = version_lines[0].split(" version ")[-1].split()[0] if version_lines else "unknown"
+
+        encoders = set()
+        for line in _list_output("-encoders"):
+            # e.g. " V....D libx264              libx264 H.264 / AVC ..."
+            parts = line.split()
+            if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in "VAS" and parts[0] != "------":
+                encoders.add(parts[1])
+
+        hwaccels = set()
+        for line in _list_output("-hwaccels"):
+            line = line.strip()
+            if line and not line.endswith(":"):
+                hwaccels.add(line)
+
+        filters = set()
+        for line in _list_output("-filters"):
+            # e.g. " T.C overlay           VV->V      Overlay a video source on top of the input."
+            parts = line.split()
+            if len(parts) >= 3 and "->" in parts[2]:
+                filters.add(parts[1])
+
+        _capabilities = {
+            "version": version,
+            "encoders": encoders,
+            "hwaccels": hwaccels,
+            "filters": filters,
+        }
+    return _capabilities
+
+def has_encoder(name):
+    return name in get_capabilities()["encoders"]
+
+def has_filter(name):
+    return name in get_capabilities()["filters"]
+
+def run_ffmpeg(args, progress=None, duration=None):
+    """
+    Runs ffmpeg with the given arguments and raises if it fails.
+    If progress is given, it is called with the fraction done (0..1) of `duration` seconds
+    of output; an exception raised by the callback kills ffmpeg and propagates.
+    """
+    cmd = [get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y"]
+    if progress is None:
+        result = subprocess.run(cmd + list(args), capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"ffmpeg failed ({result.returncode}): {result.stderr.strip()}")
+        return result
+
+    cmd += ["-progress", "pipe:1", "-nostats"] + list(args)
+    with tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file, text=True)
+        try:
+            for line in proc.stdout:
+                key, _, value = line.strip().partition("=")
+                # out_time_ms is in microseconds too (historical ffmpeg naming)
+                if key in ("out_time_us", "out_time_ms") and duration and value.isdigit():
+                    progress(min(1.0, int(value) / 1_000_000 / duration))
+                elif key == "progress" and value == "end":
+                    progress(1.0)
+            proc.wait()
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        if proc.returncode != 0:
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode("utf-8", "replace")
+            raise Exception(f"ffmpeg failed ({proc.returncode}): {stderr.strip()}")
+    return proc
+
+def probe_media(path):
+    """
+    Reads basic stream information from a media file without decoding it.
+    Returns a dict with duration, video/audio codec, size and fps (missing values are None).
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    # 'ffmpeg -i' with no output prints the stream summary to stderr and exits with 1
+    result = subprocess.run([get_ffmpeg_exe(), "-hide_banner", "-i", path], capture_output=True, text=True)
+    output = result.stderr
+
+    info = {
+        "duration": None,
+        "video_codec": None,
+        "audio_codec": None,
+        "width": None,
+        "height": None,
+        "fps": None,
+    }
+
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", output)
+    if match:
+        hours, minutes, seconds = match.groups()
+        info["duration"] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    for line in output.splitlines():
+        line = line.strip()
+        if not line.startswith("Stream #"):
+            continue
+        if ": Video: " in line and info["video_codec"] is None:
+            info["video_codec"] = line.split(": Video: ", 1)[1].split()[0].strip(",")
+            size = re.search(r", (\d{2,5})x(\d{2,5})", line)
+            if size:
+                info["width"], info["height"] = int(size.group(1)), int(size.group(2))
+            fps = re.search(r"([\d.]+) fps", line)
+            if fps:
+                info["fps"] = float(fps.group(1))
+        elif ": Audio: " in line and info["audio_codec"] is None:
+            info["audio_codec"] = line.split(": Audio: ", 1)[1].split()[0].strip(",")
+
+    return info
+
+def cut_media(input_path, output_path, start_time, duration, accurate=False):
+    """
+    Cuts [start_time, start_time + duration] out of a media file.
+    By default the streams are copied, so the cut starts on the keyframe at or before
+    start_time. With accurate=True the input is fast-seeked and the range re-encoded.
+    """
+    args = ["-ss", f"{start_time:.3f}", "-i", input_path, "-t", f"{duration:.3f}",
+            "-map", "0:v:0?", "-map", "0:a:0?"]
+    if accurate:
+        args += ["-c:v", "libx264", "-preset", "veryfast", "-crf", "20", "-c:a", "aac"]
+    else:
+        args += ["-c", "copy", "-avoid_negative_ts", "make_zero"]
+    args += ["-movflags", "+faststart", output_path]
+    run_ffmpeg(args)
+    return output_path
+
+def count_frames(path):
+    """
+    Returns the number of frames in the first video stream of path.
+    Packets are stream-copied to the framecrc muxer (one line per packet), so
+    nothing is decoded.
+    """
+    result = subprocess.run(
+        [get_ffmpeg_exe(), "-hide_banner", "-i", path, "-map", "0:v:0", "-c", "copy", "-f", "framecrc", "-"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg failed ({result.returncode}): {result.stderr.strip()}")
+    return sum(1 for line in result.stdout.splitlines() if line and not line.startswith("#"))
+
+def keyframe_times(path):
+    """
+    Returns the timestamps (seconds) of the video keyframes in path.
+    Only keyframes are decoded, so this is fast even for long files.
+    """
+    result = subprocess.run(
+        [get_ffmpeg_exe(), "-hide_banner", "-skip_frame", "nokey", "-i", path,
+         "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg failed ({result.returncode}): {result.stderr.strip()}")
+    return [float(t) for t in re.findall(r"pts_time:\s*(-?[\d.]+)", result.stderr)]
+
+def h264_parameter_sets(path):
+    """
+    Returns the SPS/PPS NAL units stored in path's container (the avcC extradata)
+    as a list of (unit name, [(field, value), ...]). Nothing is decoded.
+    """
+    result = subprocess.run(
+        [get_ffmpeg_exe(), "-hide_banner", "-i", path, "-map", "0:v:0", "-c", "copy",
+         "-bsf:v", "trace_headers", "-frames:v", "1", "-f", "null", "-"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg failed ({result.returncode}): {result.stderr.strip()}")
+    units = []
+    in_extradata = False
+    for line in result.stderr.splitlines():
+        match = re.match(r"\[trace_headers @ [^\]]+\] (.*)$", line)
+        if not match:
+            continue
+        text = match.group(1).strip()
+        if text == "Extradata":
+            in_extradata = True
+        elif text.startswith("Packet:"):
+            break
+        elif in_extradata:
+            # e.g. "8           profile_idc                   01100100 = 100"
+            field = re.match(r"\d+\s+(\S+)\s+[01]+ = (-?\d+)$", text)
+            if field:
+                units[-1][1].append(field.groups())
+            else:
+                units.append((text, []))
+    return units
+
+def x264_options(path):
+    """
+    Returns the settings x264 recorded in the SEI of path's first frame as a dict
+    (e.g. {'cabac': '1', 'ref': '3', 'crf': '23.0', ...}), or None if the stream
+    was not encoded by x264.
+    """
+    result = subprocess.run(
+        [get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-i", path, "-map", "0:v:0", "-c", "copy",
+         "-frames:v", "1", "-f", "h264", "-"],
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg failed ({result.returncode}): {result.stderr.decode('utf-8', 'replace').strip()}")
+    start = result.stdout.find(b"x264 - core")
+    if start < 0:
+        return None
+    end = result.stdout.find(b"\x00", start)
+    text = result.stdout[start:end if end >= 0 else None].decode("ascii", "replace")
+    if " - options: " not in text:
+        return None
+    return dict(item.split("=", 1) for item in text.split(" - options: ", 1)[1].split() if "=" in item)
+
+def decode_check(path):
+    """
+    Decodes the first video stream of path completely and returns its frame count.
+    Raises if the decoder reports any error (corrupt or undecodable frames).
+    """
+    result = subprocess.run(
+        [get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-xerror", "-err_detect", "explode",
+         "-i", path, "-map", "0:v:0", "-f", "framecrc", "-"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0 or result.stderr.strip():
+        raise Exception(f"Decoding {path} failed: {result.stderr.strip()}")
+    return sum(1 for line in result.stdout.splitlines() if line and not line.startswith("#"))
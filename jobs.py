@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Heavy renders run in a bounded process pool shared by all Streamlit sessions
+JOBS_DB = os.environ.get("JOBS_DB", "content/jobs.sqlite")
+MAX_RENDER_WORKERS = int(os.environ.get("MAX_RENDER_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+
+# Minimum seconds between progress writes to the job table
+PROGRESS_INTERVAL = 0.5
+
+ACTIVE_STATES = ("queued", "running", "cancelling")
+
+_pool = None
+_pool_lock = threading.Lock()
+_futures = {}
+
+def _connect(db_path=None):
+    db_path = db_path or JOBS_DB
+    db_dir = os.path.dirname(db_path)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _init_db(db_path=None):
+    with _connect(db_path) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT,
+                params TEXT,
+                status TEXT,
+                progress REAL,
+                result TEXT,
+                error TEXT,
+                created REAL,
+                updated REAL
+            )
+        """)
+
+def _update(job_id, db_path=None, **fields):
+    fields["updated"] = time.time()
+    columns = ", ".join(f"{name} = ?" for name in fields)
+    with _connect(db_path) as conn:
+        conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", list(fields.values()) + [job_id])
+
+def _get_status(job_id, db_path=None):
+    with _connect(db_path) as conn:
+        row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return row["status"] if row else None
+
+# --- Job kinds (run inside worker processes) ---
+
+def _job_slideshow(params, progress):
+    import video_engine
+    return video_engine.create_video(params["image_paths"], params["audio_path"], params["output_filename"],
+                                      progress=progress, profile=params.get("profile", video_engine.DEFAULT_PROFILE))
+
+def _job_clip_video(params, progress):
+    import downloader
+    import video_engine
+    clip_path = downloader.download_video_clip(params["url"], "broll", start_time=params["start_time"], duration=params["duration"])
+    return video_engine.create_video_with_clip(
+        clip_path,
+        params.get("audio_path"),
+        params["output_filename"],
+        keep_original_audio=params.get("audio_path") is None,
+        progress=progress,
+        profile=params.get("profile", video_engine.DEFAULT_PROFILE),
+    )
+
+def _job_edit(params, progress):
+    import video_engine
+    return video_engine.process_video(
+        params["video_path"],
+        start_time=params.get("start_time", 0),
+        end_time=params.get("end_time"),
+        text_overlay=params.get("text_overlay"),
+        speed=params.get("speed", 1.0),
+        output_filename=params["output_filename"],
+        progress=progress,
+        profile=params.get("profile", video_engine.DEFAULT_PROFILE),
+        preview=params.get("preview", False),
+    )
+
+JOB_KINDS = {
+    "slideshow": _job_slideshow,
+    "clip_video": _job_clip_video,
+    "edit": _job_edit,
+}
+
+def _run_job(job_id, kind, params, db_path):
+    """Entry point in the worker process."""
+    import video_engine
+
+    status = _get_status(job_id, db_path)
+    if status == "cancelling":
+        _update(job_id, db_path, status="cancelled")
+    if status != "queued":
+        return None
+    _update(job_id, db_path, status="running", progress=0.0)
+
+    last_write = [0.0]
+
+    def progress(fraction):
+        now = time.time()
+        if now - last_write[0] < PROGRESS_INTERVAL:
+            return
+        last_write[0] = now
+        if _get_status(job_id, db_path) == "cancelling":
+            raise video_engine.RenderCancelled(f"Job {job_id} cancelled")
+        _update(job_id, db_path, progress=fraction)
+
+    try:
+        result = JOB_KINDS[kind](params, progress)
+        _update(job_id, db_path, status="done", progress=1.0, result=result)
+        return result
+    except Exception as e:
+        # Cancellation can arrive wrapped in the engine's generic error
+        if _get_status(job_id, db_path) == "cancelling":
+            _update(job_id, db_path, status="cancelled")
+        else:
+            _update(job_id, db_path, status="failed", error=str(e))
+        return None
+
+def _init_worker(running_renders):
+    import video_engine
+    video_engine.set_render_counter(running_renders)
+
+# --- Public API (Streamlit process) ---
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _init_db()
+            _recover_interrupted()
+            # spawn: Streamlit's server threads make fork unsafe
+            context = multiprocessing.get_context("spawn")
+            # Workers count the renders actually running, so one render on an idle box gets every core
+            _pool = ProcessPoolExecutor(max_workers=MAX_RENDER_WORKERS, mp_context=context,
+                                        initializer=_init_worker, initargs=(context.Value("i", 0),))
+        return _pool
+
+def _recover_interrupted():
+    """Jobs left active by a previous server process can never finish; mark them failed."""
+    with _connect() as conn:
+        conn.execute(
+            f"UPDATE jobs SET status = 'failed', error = 'Interrupted by server restart', updated = ? "
+            f"WHERE status IN ({', '.join('?' for _ in ACTIVE_STATES)})",
+            (time.time(),) + ACTIVE_STATES,
+        )
+
+def submit(kind, **params):
+    """Queues a render job and returns its id."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    pool = _get_pool()
+    job_id = uuid.uuid4().hex[:12]
+    now = time.time()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, kind, params, status, progress, created, updated) VALUES (?, ?, ?, 'queued', 0, ?, ?)",
+            (job_id, kind, json.dumps(params), now, now),
+        )
+    future = pool.submit(_run_job, job_id, kind, params, JOBS_DB)
+    _futures[job_id] = future
+    future.add_done_callback(lambda f: _futures.pop(job_id, None))
+    return job_id
+
+def get_job(job_id):
+    """Returns the job row as a dict, or None."""
+    _init_db()
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if not row:
+        return None
+    job = dict(row)
+    job["params"] = json.loads(job["params"] or "{}")
+    return job
+
+def list_jobs(limit=20):
+    _init_db()
+    with _connect() as conn:
+        rows = conn.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+    return [dict(row) for row in rows]
+
+def cancel(job_id):
+    """Cancels a queued job immediately, or asks a running one to stop at its next progress update."""
+    future = _futures.get(job_id)
+    if future and future.cancel():
+        _update(job_id, status="cancelled")
+        return True
+    if _get_status(job_id) in ("queued", "running"):
+        _update(job_id, status="cancelling")
+        return True
+    return False
@@ -0,0 +1,134 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import prompts
+
+MODEL_NAME = "gemini-1.5-flash"
+
+# Responses are reused for identical (model, system prompt, prompt) within the TTL
+LLM_CACHE_DB = os.environ.get("LLM_CACHE_DB", "content/cache/llm.sqlite")
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+
+_models = {}
+_models_lock = threading.Lock()
+_db_lock = threading.Lock()
+_db_ready = False
+
+def _hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def get_model(api_key, model_name=MODEL_NAME, system_prompt=prompts.SYSTEM_PROMPT):
+    """
+    Returns a process-wide GenerativeModel for this API key, created on first use.
+    """
+    key = (_hash(api_key), model_name, _hash(system_prompt))
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            import google.generativeai as genai
+            from google.generativeai import client as genai_client
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(model_name, system_instruction=system_prompt)
+            # GenerativeModel otherwise creates its client on first use from whatever key the
+            # last genai.configure() set; binding it here (under the lock) ties it to this key
+            model._client = genai_client.get_default_generative_client()
+            _models[key] = model
+        return model
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+class StubModel:
+    """Offline stand-in for GenerativeModel (tests, dry runs)."""
+
+    def __init__(self, model_name="stub", reply=None):
+        self.model_name = model_name
+        self.reply = reply
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        text = self.reply if self.reply is not None else f"[stub response]\n{prompt.strip()}"
+        if stream:
+            words = text.split(" ")
+            return [StubResponse(word if i == 0 else f" {word}") for i, word in enumerate(words)]
+        return StubResponse(text)
+
+def _connect():
+    global _db_ready
+    db_dir = os.path.dirname(LLM_CACHE_DB)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir, exist_ok=True)
+    conn = sqlite3.connect(LLM_CACHE_DB, timeout=10)
+    if not _db_ready:
+        with _db_lock:
+            conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model TEXT, text TEXT, created REAL)")
+            conn.commit()
+            _db_ready = True
+    return conn
+
+def cache_key(model_name, system_prompt, prompt):
+    return _hash("\n".join([model_name, _hash(system_prompt or ""), prompt]))
+
+def get_cached(key, ttl=LLM_CACHE_TTL):
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT text, created FROM responses WHERE key = ?", (key,)).fetchone()
+    finally:
+        conn.close()
+    if row and time.time() - row[1] < ttl:
+        return row[0]
+    return None
+
+def put_cached(key, model_name, text):
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO responses (key, model, text, created) VALUES (?, ?, ?, ?)",
+                         (key, model_name, text, time.time()))
+    finally:
+        conn.close()
+
+def generate(model, prompt, system_prompt=prompts.SYSTEM_PROMPT, use_cache=True, ttl=LLM_CACHE_TTL):
+    """
+    Returns the model's text for prompt, served from the response cache when possible.
+    use_cache=False always calls the model (the fresh answer still refreshes the cache).
+    """
+    model_name = getattr(model, "model_name", MODEL_NAME)
+    key = cache_key(model_name, system_prompt, prompt)
+    if use_cache:
+        cached = get_cached(key, ttl)
+        if cached is not None:
+            return cached
+    response = model.generate_content(prompt)
+    text = response.text
+    put_cached(key, model_name, text)
+    return text
+
+def stream_generate(model, prompt, system_prompt=prompts.SYSTEM_PROMPT, use_cache=True, ttl=LLM_CACHE_TTL):
+    """
+    Yields the model's text chunk by chunk as it is generated (stream=True).
+    A cached answer is yielded in one piece; the full streamed text is cached at the end.
+    """
+    model_name = getattr(model, "model_name", MODEL_NAME)
+    key = cache_key(model_name, system_prompt, prompt)
+    if use_cache:
+        cached = get_cached(key, ttl)
+        if cached is not None:
+            yield cached
+            return
+    parts = []
+    for chunk in model.generate_content(prompt, stream=True):
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. safety metadata) have no .text
+            continue
+        if text:
+            parts.append(text)
+            yield text
+    if parts:
+        put_cached(key, model_name, "".join(parts))
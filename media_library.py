@@ -0,0 +1,210 @@
+import os
+import time
+import fnmatch
+import sqlite3
+import threading
+import ffmpeg_tools
+from disk_cache import make_key
+
+# Index of the audio/image/video files the app offers for selection
+MEDIA_DB = os.environ.get("MEDIA_DB", "content/cache/media.sqlite")
+THUMB_DIR = os.environ.get("THUMB_DIR", "content/cache/thumbs")
+THUMB_SIZE = 160
+
+# Minimum seconds between rescans; a rescan only lists directories whose mtime changed
+# (the files already indexed elsewhere are just stat'ed, to catch in-place overwrites)
+RESCAN_INTERVAL = float(os.environ.get("MEDIA_RESCAN_INTERVAL", "5"))
+
+# (directory, filename pattern, kind) scanned non-recursively
+MEDIA_ROOTS = [
+    ("content/audio", "*.mp3", "audio"),
+    ("content", "*.png", "image"),
+    ("content/history", "*.png", "image"),
+    (".", "*.png", "image"),
+    ("C:/Users/Wak/.gemini/antigravity/brain/05018379-5571-4970-ab84-119a5a6cabe2", "*.png", "image"),
+    ("content/videos", "*.mp4", "video"),
+    ("content/videos/edited", "*.mp4", "video"),
+]
+
+_scan_lock = threading.Lock()
+_last_scan = 0.0
+_dir_mtimes = {}
+_db_ready = False
+
+def _connect():
+    global _db_ready
+    db_dir = os.path.dirname(MEDIA_DB)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir, exist_ok=True)
+    conn = sqlite3.connect(MEDIA_DB, timeout=10)
+    conn.row_factory = sqlite3.Row
+    if not _db_ready:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS media (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE,
+                root TEXT,
+                kind TEXT,
+                name TEXT,
+                size INTEGER,
+                mtime REAL,
+                duration REAL,
+                width INTEGER,
+                height INTEGER,
+                thumb TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS media_kind ON media (kind, mtime)")
+        conn.commit()
+        _db_ready = True
+    return conn
+
+def _make_thumbnail(path, kind, size, mtime, duration):
+    """Writes a small PNG preview for an image or video and returns its path (None for audio)."""
+    if kind == "audio":
+        return None
+    if not os.path.exists(THUMB_DIR):
+        os.makedirs(THUMB_DIR, exist_ok=True)
+    thumb_path = os.path.join(THUMB_DIR, make_key("thumb", os.path.abspath(path), size, mtime) + ".png")
+    if os.path.exists(thumb_path):
+        return thumb_path
+    if kind == "image":
+        from PIL import Image
+        with Image.open(path) as image:
+            image.thumbnail((THUMB_SIZE, THUMB_SIZE))
+            image.save(thumb_path)
+    else:
+        seek = min(1.0, (duration or 0) / 2)
+        ffmpeg_tools.run_ffmpeg(["-ss", f"{seek:.3f}", "-i", path, "-frames:v", "1",
+                                 "-vf", f"scale={THUMB_SIZE}:-2", thumb_path])
+    return thumb_path
+
+def _describe(path, kind, size, mtime):
+    """Reads duration, dimensions and a thumbnail for a new or changed file."""
+    info = {"duration": None, "width": None, "height": None, "thumb": None}
+    try:
+        probe = ffmpeg_tools.probe_media(path)
+        info.update(duration=probe["duration"] if kind != "image" else None,
+                    width=probe["width"], height=probe["height"])
+    except Exception as e:
+        print(f"Could not probe {path}: {e}")
+    try:
+        info["thumb"] = _make_thumbnail(path, kind, size, mtime, info["duration"])
+    except Exception as e:
+        print(f"Could not make thumbnail for {path}: {e}")
+    return info
+
+def _remove_thumb(thumb):
+    if thumb and os.path.exists(thumb):
+        try:
+            os.remove(thumb)
+        except OSError:
+            pass
+
+def _index_file(conn, root, kind, path, stat, row):
+    """Adds or updates path in the index unless its size and mtime are unchanged."""
+    if row and row["size"] == stat.st_size and row["mtime"] == stat.st_mtime:
+        return
+    if row:
+        _remove_thumb(row["thumb"])
+    info = _describe(path, kind, stat.st_size, stat.st_mtime)
+    conn.execute(
+        "INSERT INTO media (path, root, kind, name, size, mtime, duration, width, height, thumb) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, "
+        "duration = excluded.duration, width = excluded.width, height = excluded.height, thumb = excluded.thumb",
+        (path, root, kind, os.path.basename(path), stat.st_size, stat.st_mtime,
+         info["duration"], info["width"], info["height"], info["thumb"]),
+    )
+
+def _forget(conn, path, row):
+    _remove_thumb(row["thumb"])
+    conn.execute("DELETE FROM media WHERE path = ?", (path,))
+
+def _known_files(conn, root, kind):
+    return {row["path"]: row for row in conn.execute(
+        "SELECT path, size, mtime, thumb FROM media WHERE root = ? AND kind = ?", (root, kind))}
+
+def _scan_root(conn, root, pattern, kind):
+    try:
+        entries = [e for e in os.scandir(root) if e.is_file() and fnmatch.fnmatch(e.name, pattern)]
+    except OSError:
+        entries = []
+    known = _known_files(conn, root, kind)
+
+    seen = set()
+    for entry in entries:
+        path = os.path.normpath(entry.path)
+        seen.add(path)
+        _index_file(conn, root, kind, path, entry.stat(), known.get(path))
+
+    for path, row in known.items():
+        if path not in seen:
+            _forget(conn, path, row)
+
+def _restat_root(conn, root, kind):
+    """
+    Checks the indexed files of an unchanged directory: overwriting a file in place
+    (e.g. shutil.copyfile onto an existing name) doesn't change the directory's mtime.
+    """
+    for path, row in _known_files(conn, root, kind).items():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            _forget(conn, path, row)
+            continue
+        _index_file(conn, root, kind, path, stat, row)
+
+def rescan(force=False):
+    """
+    Brings the index up to date with MEDIA_ROOTS. Runs at most once per RESCAN_INTERVAL
+    (unless force=True) and only lists directories that changed since the last scan
+    (files already indexed are stat'ed either way); files are probed only when new or
+    modified.
+    """
+    global _last_scan
+    with _scan_lock:
+        now = time.monotonic()
+        if not force and now - _last_scan < RESCAN_INTERVAL:
+            return
+        _last_scan = now
+        conn = _connect()
+        try:
+            with conn:
+                for root, pattern, kind in MEDIA_ROOTS:
+                    try:
+                        dir_mtime = os.stat(root).st_mtime
+                    except OSError:
+                        dir_mtime = None
+                    key = (root, pattern, kind)
+                    if not force and key in _dir_mtimes and _dir_mtimes[key] == dir_mtime:
+                        _restat_root(conn, root, kind)
+                        continue
+                    _scan_root(conn, root, pattern, kind)
+                    _dir_mtimes[key] = dir_mtime
+        finally:
+            conn.close()
+
+def list_media(kind):
+    """Returns the indexed files of one kind ('audio', 'image', 'video'), newest first."""
+    rescan()
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT * FROM media WHERE kind = ? ORDER BY mtime DESC", (kind,)).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
+def get_media(media_id):
+    """Returns one indexed file as a dict, or None."""
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM media WHERE id = ?", (media_id,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+def label(item):
+    """Display name for pickers; the folder tells apart files with the same name."""
+    folder = os.path.dirname(item["path"]) or "."
+    return f"{item['name']} ({folder})"
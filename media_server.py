@@ -0,0 +1,230 @@
+"""
+Small HTTP file server for rendered media, started next to the Streamlit app.
+
+The page hands the browser a URL instead of the file's bytes, so videos and audio
+are streamed from disk (with Range support for seeking) rather than held in the
+Streamlit server's memory for every session.
+
+The server is opt-in: it only runs when MEDIA_BASE_URL is set to an address the
+viewers' browsers can reach (typically an HTTPS path on the same host, proxied to
+MEDIA_SERVER_HOST:MEDIA_SERVER_PORT). Without it, files are hard-linked (or copied)
+into the app's static/ folder and served same-origin by Streamlit's static file
+serving (server.enableStaticServing in .streamlit/config.toml); only when that is
+off too does the app fall back to Streamlit's in-memory media delivery.
+"""
+import os
+import re
+import shutil
+import hashlib
+import mimetypes
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Public base URL of the server as seen by the browser, e.g. https://example.org/media-files
+# (empty = server disabled, media is delivered through Streamlit as before)
+MEDIA_BASE_URL = os.environ.get("MEDIA_BASE_URL", "")
+MEDIA_SERVER_HOST = os.environ.get("MEDIA_SERVER_HOST", "127.0.0.1")
+MEDIA_SERVER_PORT = int(os.environ.get("MEDIA_SERVER_PORT", "8502"))
+
+# Streamlit serves <app dir>/static/<path> at app/static/<path>
+STATIC_DIR = os.environ.get("MEDIA_STATIC_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
+STATIC_URL = "app/static"
+# Streamlit refuses larger static files
+MAX_STATIC_SIZE = int(os.environ.get("MEDIA_MAX_STATIC_SIZE", str(200 * 1024 * 1024)))
+
+CHUNK_SIZE = 256 * 1024
+
+_files = {}
+_files_lock = threading.Lock()
+_server = None
+_server_lock = threading.Lock()
+_server_failed = False
+_static_paths = {}
+_static_pruned = False
+
+def _parse_range(header, size):
+    """Returns (start, end) inclusive for a single 'bytes=' range, or None if unsatisfiable."""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(0, size - int(last))
+        end = size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+class _MediaHandler(BaseHTTPRequestHandler):
+    """Serves registered files at /media/<token>/<filename>."""
+
+    def _lookup(self):
+        parts = urllib.parse.urlsplit(self.path)
+        match = re.fullmatch(r"/media/([0-9a-f]+)/[^/]*", parts.path)
+        if not match:
+            return None, None
+        with _files_lock:
+            path = _files.get(match.group(1))
+        return path, urllib.parse.parse_qs(parts.query)
+
+    def _send_file(self, head_only):
+        path, query = self._lookup()
+        if not path or not os.path.exists(path):
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        status = 200
+        if self.headers.get("Range"):
+            requested = _parse_range(self.headers["Range"], size)
+            if requested is None:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            start, end = requested
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        if query.get("download"):
+            self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(path)}"')
+        self.end_headers()
+        if head_only:
+            return
+
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            try:
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                # Browsers drop connections when seeking
+                pass
+
+    def do_GET(self):
+        self._send_file(head_only=False)
+
+    def do_HEAD(self):
+        self._send_file(head_only=True)
+
+    def log_message(self, format, *args):
+        pass
+
+def start():
+    """
+    Starts the server in a daemon thread once per process. Returns False if it is
+    not configured (no MEDIA_BASE_URL) or could not start.
+    """
+    global _server, _server_failed
+    with _server_lock:
+        if _server is None and not _server_failed:
+            if not MEDIA_BASE_URL or not MEDIA_SERVER_PORT:
+                _server_failed = True
+                return False
+            try:
+                _server = ThreadingHTTPServer((MEDIA_SERVER_HOST, MEDIA_SERVER_PORT), _MediaHandler)
+            except OSError as e:
+                print(f"Media server could not start on port {MEDIA_SERVER_PORT}: {e}")
+                _server_failed = True
+                return False
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="media-server", daemon=True).start()
+        return _server is not None
+
+def _token(path, stat):
+    return hashlib.sha256(f"{path}\n{stat.st_size}\n{stat.st_mtime}".encode("utf-8")).hexdigest()[:32]
+
+def static_serving_enabled():
+    """True if Streamlit is serving the static/ folder (server.enableStaticServing)."""
+    try:
+        import streamlit as st
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+def _remove_static(token):
+    shutil.rmtree(os.path.join(STATIC_DIR, "media", token), ignore_errors=True)
+
+def _prune_static():
+    """
+    Drops links left by earlier runs whose file has since been replaced or deleted
+    (the link is then the last name of the old contents) and all copies; both are
+    recreated on demand.
+    """
+    media_dir = os.path.join(STATIC_DIR, "media")
+    if not os.path.isdir(media_dir):
+        return
+    for token in os.listdir(media_dir):
+        token_dir = os.path.join(media_dir, token)
+        try:
+            names = os.listdir(token_dir)
+            if names and os.stat(os.path.join(token_dir, names[0])).st_nlink > 1:
+                continue
+        except OSError:
+            pass
+        _remove_static(token)
+
+def _static_url(path):
+    """
+    Publishes path under static/media/<token>/ and returns its URL, or None if static
+    serving is off or the file is too large for it. A hard link costs no space and
+    keeps the old contents if the file is replaced; a copy is made only when linking
+    fails (e.g. across filesystems).
+    """
+    global _static_pruned
+    stat = os.stat(path)
+    if stat.st_size > MAX_STATIC_SIZE or not static_serving_enabled():
+        return None
+    token = _token(path, stat)
+    name = os.path.basename(path)
+    target = os.path.join(STATIC_DIR, "media", token, name)
+    with _files_lock:
+        if not _static_pruned:
+            _prune_static()
+            _static_pruned = True
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_target = f"{target}.{os.getpid()}.tmp"
+            try:
+                os.link(path, tmp_target)
+            except OSError:
+                shutil.copyfile(path, tmp_target)
+            os.replace(tmp_target, target)
+        previous = _static_paths.get(path)
+        _static_paths[path] = token
+    if previous and previous != token:
+        _remove_static(previous)
+    return f"{STATIC_URL}/media/{token}/{urllib.parse.quote(name)}"
+
+def media_url(path, download=False):
+    """
+    Returns a URL the browser can stream path from: the media server's when
+    MEDIA_BASE_URL is set, otherwise Streamlit's static serving. None if neither is
+    available. The token changes when the file does, so browsers don't reuse a
+    stale cached copy. Static URLs have no download variant (use an <a download> link).
+    """
+    if not os.path.exists(path):
+        return None
+    path = os.path.abspath(path)
+    if not start():
+        return _static_url(path)
+    token = _token(path, os.stat(path))
+    with _files_lock:
+        _files[token] = path
+    url = f"{MEDIA_BASE_URL.rstrip('/')}/media/{token}/{urllib.parse.quote(os.path.basename(path))}"
+    return f"{url}?download=1" if download else url
@@ -0,0 +1,209 @@
+"""
+Headless batch pipeline: topic list -> script -> SEO -> voice -> video.
+
+Usage:
+    python pipeline.py topics.txt --images content/thumb.png --batch weekly_series
+
+Each topic runs as a small DAG (SEO in parallel with script -> voice -> video).
+LLM and TTS calls run concurrently under limits, renders go to a process pool,
+and finished stages are checkpointed so a rerun resumes where it stopped.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import prompts
+import llm_engine
+import voice_engine
+import video_engine
+
+BATCH_DIR = "content/batches"
+STAGES = ("script", "seo", "voice", "video")
+
+class RateLimiter:
+    """Allows at most `per_minute` calls per minute (evenly spaced)."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+class Checkpoint:
+    """Per-batch state file recording the output of every finished stage."""
+
+    def __init__(self, batch_dir):
+        self.path = os.path.join(batch_dir, "state.json")
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.state = {}
+
+    def get(self, slug, stage):
+        with self._lock:
+            return self.state.get(slug, {}).get(stage)
+
+    def set(self, slug, stage, output):
+        with self._lock:
+            self.state.setdefault(slug, {})[stage] = output
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+def slugify(topic):
+    slug = re.sub(r"[^\w]+", "_", topic.lower()).strip("_")
+    return slug[:60] or "topic"
+
+def script_to_narration(script):
+    """Strips markdown and bracketed stage directions so only spoken text goes to TTS."""
+    text = re.sub(r"\[[^\]]*\]|\([^)]*(?:music|sfx|visual|scene)[^)]*\)", "", script, flags=re.IGNORECASE)
+    text = re.sub(r"^#+\s*", "", text, flags=re.MULTILINE)
+    text = re.sub(r"[*_`>]", "", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def _init_render_worker(running_renders):
+    video_engine.set_render_counter(running_renders)
+
+def _render(image_paths, audio_path, output_filename, profile):
+    """Runs in the render process pool."""
+    return video_engine.create_video(image_paths, audio_path, output_filename, profile=profile)
+
+def run_batch(topics, model=None, api_key=None, image_paths=None, voice_key="Afaan Oromo (Female)",
+              batch_name="batch", rate="+0%", pitch="+0Hz", llm_concurrency=2, llm_per_minute=15,
+              tts_concurrency=2, render_workers=None, profile=video_engine.DEFAULT_PROFILE, log=print):
+    """
+    Runs the full pipeline for every topic and returns {topic: {stage: output}}.
+    Without image_paths the video stage is skipped. Rerunning the same batch_name
+    skips stages that already finished.
+    """
+    if model is None:
+        if not api_key:
+            raise ValueError("Provide a model or a Gemini API key.")
+        model = llm_engine.get_model(api_key)
+
+    batch_dir = os.path.join(BATCH_DIR, batch_name)
+    if not os.path.exists(batch_dir):
+        os.makedirs(batch_dir)
+    checkpoint = Checkpoint(batch_dir)
+
+    llm_slots = threading.Semaphore(llm_concurrency)
+    tts_slots = threading.Semaphore(tts_concurrency)
+    limiter = RateLimiter(llm_per_minute)
+    context = multiprocessing.get_context("spawn")
+    render_pool = ProcessPoolExecutor(max_workers=render_workers, mp_context=context,
+                                      initializer=_init_render_worker, initargs=(context.Value("i", 0),))
+
+    def llm_stage(slug, stage, prompt):
+        done = checkpoint.get(slug, stage)
+        if done and os.path.exists(done):
+            return done
+        with llm_slots:
+            limiter.wait()
+            text = llm_engine.generate(model, prompt)
+        path = os.path.join(batch_dir, f"{slug}_{stage}.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        checkpoint.set(slug, stage, path)
+        log(f"[{slug}] {stage} done")
+        return path
+
+    def voice_stage(slug, script_path):
+        done = checkpoint.get(slug, "voice")
+        if done and os.path.exists(done):
+            return done
+        with open(script_path, "r", encoding="utf-8") as f:
+            narration = script_to_narration(f.read())
+        with tts_slots:
+            path = voice_engine.run_tts(narration, voice_key, f"{batch_name}_{slug}", rate=rate, pitch=pitch)
+        if not os.path.exists(path):
+            raise Exception(f"Voice generation failed for {slug}")
+        checkpoint.set(slug, "voice", path)
+        log(f"[{slug}] voice done")
+        return path
+
+    def video_stage(slug, audio_path):
+        done = checkpoint.get(slug, "video")
+        if done and os.path.exists(done):
+            return done
+        path = render_pool.submit(_render, image_paths, audio_path, f"{batch_name}_{slug}", profile).result()
+        checkpoint.set(slug, "video", path)
+        log(f"[{slug}] video done")
+        return path
+
+    def run_topic(topic, helpers):
+        slug = slugify(topic)
+        seo_future = helpers.submit(llm_stage, slug, "seo", prompts.get_seo_prompt(topic))
+        outputs = {"script": llm_stage(slug, "script", prompts.get_script_prompt(topic))}
+        outputs["voice"] = voice_stage(slug, outputs["script"])
+        if image_paths:
+            outputs["video"] = video_stage(slug, outputs["voice"])
+        outputs["seo"] = seo_future.result()
+        return outputs
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, len(topics))) as topic_pool, \
+             ThreadPoolExecutor(max_workers=max(1, llm_concurrency)) as helpers:
+            futures = {topic: topic_pool.submit(run_topic, topic, helpers) for topic in topics}
+            for topic, future in futures.items():
+                try:
+                    results[topic] = future.result()
+                except Exception as e:
+                    log(f"[{slugify(topic)}] failed: {e}")
+                    results[topic] = {"error": str(e)}
+    finally:
+        render_pool.shutdown()
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the content pipeline for a list of topics.")
+    parser.add_argument("topics_file", help="Text file with one topic per line")
+    parser.add_argument("--images", nargs="*", default=None, help="Image(s) used as video background")
+    parser.add_argument("--voice", default="Afaan Oromo (Female)", choices=list(voice_engine.VOICES.keys()))
+    parser.add_argument("--batch", default="batch", help="Batch name (reuse it to resume)")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"))
+    parser.add_argument("--stub", action="store_true", help="Use an offline stub model instead of Gemini")
+    parser.add_argument("--llm-concurrency", type=int, default=2)
+    parser.add_argument("--llm-per-minute", type=int, default=15)
+    parser.add_argument("--tts-concurrency", type=int, default=2)
+    parser.add_argument("--render-workers", type=int, default=None)
+    parser.add_argument("--profile", default=video_engine.DEFAULT_PROFILE, choices=list(video_engine.RENDER_PROFILES))
+    args = parser.parse_args(argv)
+
+    with open(args.topics_file, "r", encoding="utf-8") as f:
+        topics = [line.strip() for line in f if line.strip()]
+
+    results = run_batch(
+        topics,
+        model=llm_engine.StubModel() if args.stub else None,
+        api_key=args.api_key,
+        image_paths=args.images,
+        voice_key=args.voice,
+        batch_name=args.batch,
+        llm_concurrency=args.llm_concurrency,
+        llm_per_minute=args.llm_per_minute,
+        tts_concurrency=args.tts_concurrency,
+        render_workers=args.render_workers,
+        profile=args.profile,
+    )
+    print(json.dumps(results, indent=2))
+    return 1 if any("error" in r for r in results.values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,23 @@
 import streamlit as st
-import google.generativeai as genai
 import prompts
+import llm_engine
 import voice_engine
-import video_engine
 import downloader
+import jobs
+import media_library
+import media_server
+import video_engine
 import os
-import glob
+import html
+import time
+
+# How often the Voice Generator refreshes its partial-audio preview while streaming
+PREVIEW_INTERVAL_SECONDS = 3.0
+
+# How often render job status panels poll the job table
+JOB_POLL_SECONDS = 2
+
+RENDER_PROFILE_NAMES = list(video_engine.RENDER_PROFILES)
 
 # Page Config
 st.set_page_config(page_title="Oromo Heritage AI", page_icon="🇪🇹", layout="wide")
@@ -44,6 +56,7 @@ with st.sidebar:
     default_key = st.secrets["GEMINI_API_KEY"] if "GEMINI_API_KEY" in st.secrets else ""
     api_key = st.text_input("Enter Gemini API Key", type="password", value=default_key)
     channel_handle = st.text_input("YouTube Channel Handle", value="@Wakjira-b8c")
+    bypass_cache = st.checkbox("Bypass response cache", value=False, help="Always ask Gemini again instead of reusing a saved answer.")
     
     st.divider()
     st.markdown(f"### Channel: {channel_handle}")
@@ -51,11 +64,80 @@ with st.sidebar:
 
 # Initialize Gemini
 if api_key:
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-1.5-flash', system_instruction=prompts.SYSTEM_PROMPT)
+    # Reused across reruns and sessions for the same key
+    model = llm_engine.get_model(api_key)
 else:
     st.warning("Please enter your Gemini API Key in the sidebar to start.")
 
+def show_media(path, kind, download_label, mime, key):
+    """
+    Plays a file and offers it for download. The browser streams it from disk through
+    media_server (its own server with MEDIA_BASE_URL, else Streamlit's static/ folder);
+    only if neither is available is the file handed to Streamlit, and then it is read for
+    the download button only when that is clicked.
+    """
+    player = st.video if kind == "video" else st.audio
+    name = os.path.basename(path)
+    url = media_server.media_url(path)
+    if url and url.startswith(media_server.STATIC_URL):
+        player(url)
+        # Same origin, so the download attribute saves the file instead of opening it
+        st.markdown(f'<a href="{html.escape(url)}" download="{html.escape(name)}">{html.escape(download_label)}</a>',
+                    unsafe_allow_html=True)
+    elif url:
+        player(url)
+        download_url = media_server.media_url(path, download=True)
+        if hasattr(st, "link_button"):
+            st.link_button(download_label, download_url)
+        else:
+            st.markdown(f"[{download_label}]({download_url})")
+    else:
+        player(path)
+        st.download_button(label=download_label, data=lambda: _read_file(path), file_name=name, mime=mime, key=key)
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def show_job_progress(job_id, state_key):
+    job = jobs.get_job(job_id)
+    if not job or job["status"] not in jobs.ACTIVE_STATES:
+        # Finished while polling: index the new file and redraw the page with the result
+        media_library.rescan(force=True)
+        st.rerun()
+    progress = job["progress"] or 0.0
+    st.progress(progress, text=f"Rendering ({job['status']})... {int(progress * 100)}%")
+    col_j1, col_j2 = st.columns(2)
+    with col_j1:
+        if st.button("🔄 Refresh", key=f"{state_key}_refresh"):
+            st.rerun()
+    with col_j2:
+        if st.button("✖ Cancel", key=f"{state_key}_cancel"):
+            jobs.cancel(job_id)
+            st.rerun()
+
+def show_job_status(job_id, download_label, state_key):
+    """Shows progress, cancel and the finished video for a background render job."""
+    job = jobs.get_job(job_id)
+    if not job:
+        return
+    status = job["status"]
+    if status in jobs.ACTIVE_STATES:
+        # Poll without blocking the rest of the page when fragments are available
+        if hasattr(st, "fragment"):
+            st.fragment(show_job_progress, run_every=JOB_POLL_SECONDS)(job_id, state_key)
+        else:
+            show_job_progress(job_id, state_key)
+    elif status == "done" and job["result"] and os.path.exists(job["result"]):
+        st.success("Video created successfully! Download it below.")
+        show_media(job["result"], "video", download_label, "video/mp4", f"{state_key}_download")
+    elif status == "cancelled":
+        st.info("Render cancelled.")
+    else:
+        st.error("Failed to create video. Please check your source settings.")
+        with st.expander("Technical Details"):
+            st.code(job["error"] or "Unknown error")
+
 # Header
 st.title("🌳 Oromo Heritage AI Generator")
 st.subheader("Create high-quality content about History, Culture, and Politics")
@@ -68,64 +150,72 @@ with tab1:
     topic_script = st.text_input("Enter Video Topic (e.g., The Gadaa System, The Battle of Gulale, Oromo Culture)")
     if st.button("Generate Script"):
         if api_key and topic_script:
-            with st.spinner("Writing script..."):
-                try:
-                    prompt = prompts.get_script_prompt(topic_script)
-                    response = model.generate_content(prompt)
-                    st.markdown("### Generated Script")
-                    st.write(response.text)
-                except Exception as e:
-                    st.error(f"Error: {e}")
+            try:
+                prompt = prompts.get_script_prompt(topic_script)
+                st.markdown("### Generated Script")
+                # Render tokens as they arrive; the full text is cached and kept for reruns
+                st.session_state.script_text = st.write_stream(llm_engine.stream_generate(model, prompt, use_cache=not bypass_cache))
+            except Exception as e:
+                st.error(f"Error: {e}")
         else:
             st.error("Please provide an API key and a topic.")
+    elif "script_text" in st.session_state:
+        st.markdown("### Generated Script")
+        st.write(st.session_state.script_text)
 
 with tab2:
     st.header("SEO & Metadata")
     topic_seo = st.text_input("Enter Topic for SEO Optimization")
     if st.button("Generate SEO Metadata"):
         if api_key and topic_seo:
-            with st.spinner("Generating SEO tags..."):
-                try:
-                    prompt = prompts.get_seo_prompt(topic_seo)
-                    response = model.generate_content(prompt)
-                    st.markdown("### Titles, Description & Tags")
-                    st.write(response.text)
-                except Exception as e:
-                    st.error(f"Error: {e}")
+            try:
+                prompt = prompts.get_seo_prompt(topic_seo)
+                st.markdown("### Titles, Description & Tags")
+                # Render tokens as they arrive; the full text is cached and kept for reruns
+                st.session_state.seo_text = st.write_stream(llm_engine.stream_generate(model, prompt, use_cache=not bypass_cache))
+            except Exception as e:
+                st.error(f"Error: {e}")
         else:
             st.error("Please provide an API key and a topic.")
+    elif "seo_text" in st.session_state:
+        st.markdown("### Titles, Description & Tags")
+        st.write(st.session_state.seo_text)
 
 with tab3:
     st.header("Historical Research Summary")
     topic_research = st.text_input("Enter Historical Fact or Event to Research")
     if st.button("Generate Summary"):
         if api_key and topic_research:
-            with st.spinner("Researching..."):
-                try:
-                    prompt = prompts.get_research_prompt(topic_research)
-                    response = model.generate_content(prompt)
-                    st.markdown("### Research Summary")
-                    st.write(response.text)
-                except Exception as e:
-                    st.error(f"Error: {e}")
+            try:
+                prompt = prompts.get_research_prompt(topic_research)
+                st.markdown("### Research Summary")
+                # Render tokens as they arrive; the full text is cached and kept for reruns
+                st.session_state.research_text = st.write_stream(llm_engine.stream_generate(model, prompt, use_cache=not bypass_cache))
+            except Exception as e:
+                st.error(f"Error: {e}")
         else:
             st.error("Please provide an API key and a topic.")
+    elif "research_text" in st.session_state:
+        st.markdown("### Research Summary")
+        st.write(st.session_state.research_text)
 
 with tab4:
     st.header("📈 Channel Growth Strategy")
     st.write(f"Generate a customized strategy for **{channel_handle}**")
     if st.button("Generate Growth Plan"):
         if api_key:
-            with st.spinner("Analyzing and planning..."):
-                try:
-                    prompt = prompts.get_growth_strategy_prompt(channel_handle)
-                    response = model.generate_content(prompt)
-                    st.markdown("### Your Customized Growth Strategy")
-                    st.write(response.text)
-                except Exception as e:
-                    st.error(f"Error: {e}")
+            try:
+                prompt = prompts.get_growth_strategy_prompt(channel_handle)
+                st.markdown("### Your Customized Growth Strategy")
+                # Render tokens as they arrive; the full text is cached and kept for reruns
+                st.session_state.strategy_text = st.write_stream(llm_engine.stream_generate(model, prompt, use_cache=not bypass_cache))
+            except Exception as e:
+                st.error(f"Error: {e}")
         else:
             st.error("Please provide an API key.")
+    elif "strategy_text" in st.session_state:
+        st.markdown("### Your Customized Growth Strategy")
+        st.write(st.session_state.strategy_text)
 
 with tab5:
     st.header("🎙️ Text-to-Speech Voice Generator")
@@ -150,17 +240,33 @@ with tab5:
                     rate_str = f"{'+' if voice_speed >= 0 else ''}{voice_speed}%"
                     pitch_str = f"{'+' if voice_pitch >= 0 else ''}{voice_pitch}Hz"
                     
-                    output_file = voice_engine.run_tts(tts_text, voice_option, audio_filename, rate=rate_str, pitch=pitch_str)
-                    if os.path.exists(output_file):
+                    if len(tts_text) >= voice_engine.CHUNKED_MIN_CHARS:
+                        # Long scripts are synthesized in parallel chunks
+                        output_file = voice_engine.run_tts(tts_text, voice_option, audio_filename, rate=rate_str, pitch=pitch_str)
+                    else:
+                        # Stream audio to disk and show progress/preview while it arrives
+                        progress_text = st.empty()
+                        preview = st.empty()
+                        output_file = None
+                        last_preview = 0.0
+                        spoken = []
+                        for event in voice_engine.stream_tts(tts_text, voice_option, audio_filename, rate=rate_str, pitch=pitch_str):
+                            if event["type"] == "done":
+                                output_file = event["path"]
+                            elif event["type"] == "audio":
+                                progress_text.caption(f"Receiving audio... {event['bytes_written'] // 1024} KB | {' '.join(spoken[-12:])}")
+                                if time.time() - last_preview > PREVIEW_INTERVAL_SECONDS:
+                                    with open(event["path"], "rb") as f:
+                                        preview.audio(f.read(), format="audio/mpeg")
+                                    last_preview = time.time()
+                            else:
+                                spoken.append(event["text"])
+                        progress_text.empty()
+                        preview.empty()
+                    
+                    if output_file and os.path.exists(output_file):
                         st.success(f"Audio generated successfully: {audio_filename}.mp3")
-                        st.audio(output_file)
-                        with open(output_file, "rb") as f:
-                            st.download_button(
-                                label="Download Voiceover",
-                                data=f,
-                                file_name=f"{audio_filename}.mp3",
-                                mime="audio/mpeg"
-                            )
+                        show_media(output_file, "audio", "Download Voiceover", "audio/mpeg", "voice_download")
                     else:
                         st.error("Failed to generate audio file.")
                 except Exception as e:
@@ -172,17 +278,17 @@ with tab6:
     st.header("🎬 Video Creator")
     st.write("Merge your voiceovers and thumbnails into final videos.")
     
-    # Selection from project folders
-    audio_files = glob.glob("content/audio/*.mp3")
-    image_files = glob.glob("content/*.png") + glob.glob("content/history/*.png") + \
-                  glob.glob("*.png") + glob.glob("C:/Users/Wak/.gemini/antigravity/brain/05018379-5571-4970-ab84-119a5a6cabe2/*.png")
+    # Selection from project folders (see media_library.MEDIA_ROOTS)
+    audio_files = {item["id"]: item for item in media_library.list_media("audio")}
+    image_files = {item["id"]: item for item in media_library.list_media("image")}
     
     col_v1, col_v2 = st.columns(2)
     with col_v1:
         audio_choice = st.radio("Audio Source", ["AI Voiceover", "Keep Original YouTube Audio"])
         if audio_choice == "AI Voiceover":
             if audio_files:
-                selected_audio = st.selectbox("Select Voiceover File", [os.path.basename(f) for f in audio_files])
+                selected_audio = st.selectbox("Select Voiceover File", list(audio_files),
+                                              format_func=lambda media_id: media_library.label(audio_files[media_id]))
             else:
                 st.info("No audio files found. Go to 'Voice Generator' to create some first.")
                 selected_audio = None
@@ -193,7 +299,11 @@ with tab6:
         source_type = st.radio("Background Visuals", ["Generated Image", "YouTube Clip"])
         if source_type == "Generated Image":
             if image_files:
-                selected_images = st.multiselect("Select Images/Thumbnails (Sequential)", [os.path.basename(f) for f in image_files])
+                selected_images = st.multiselect("Select Images/Thumbnails (Sequential)", list(image_files),
+                                                 format_func=lambda media_id: media_library.label(image_files[media_id]))
+                thumbs = [image_files[media_id]["thumb"] for media_id in selected_images if image_files[media_id]["thumb"]]
+                if thumbs:
+                    st.image(thumbs, width=media_library.THUMB_SIZE)
             else:
                 st.info("No images found. Generate some in the content tabs first.")
                 selected_images = None
@@ -209,6 +319,10 @@ with tab6:
                         else: st.error("No results found.")
                 
                 if 'yt_results' in st.session_state:
+                    if st.button("More results"):
+                        # Only the next page is fetched; earlier results come from the search cache
+                        more = downloader.search_youtube_links(yt_query, len(st.session_state.yt_results) + 3)
+                        if more: st.session_state.yt_results = more
                     selected_yt = st.selectbox("Select Clip from Results", 
                                                [f"{r['title']} ({r['url']})" for r in st.session_state.yt_results])
                     st.session_state.selected_yt_url = selected_yt.split("(")[-1].strip(")")
@@ -228,70 +342,58 @@ with tab6:
                 clip_dur = st.number_input("Duration (seconds)", min_value=1, max_value=60, value=10)
     
     video_out_name = st.text_input("Output Video Filename", value="oromo_final_video")
+    video_profile = st.selectbox("Render Profile", RENDER_PROFILE_NAMES, index=RENDER_PROFILE_NAMES.index(video_engine.DEFAULT_PROFILE),
+                                 help="Draft renders fast at low resolution for previews; Archival is slow and high quality.")
     
     if st.button("🎬 BUILD FINAL VIDEO"):
         if selected_audio and ( (source_type == "Generated Image" and selected_images) or (source_type == "YouTube Clip" and 'selected_yt_url' in st.session_state) ):
             
-            with st.spinner("Assembling your Oromo Masterpiece..."):
-                try:
-                    if source_type == "Generated Image":
-                        if selected_audio == "ORIGINAL":
-                            st.error("Cannot use 'Original YouTube Audio' with static images. Please select a Voiceover.")
-                        else:
-                            full_audio_path = next(f for f in audio_files if os.path.basename(f) == selected_audio)
-                            
-                            # Get full paths for all selected images
-                            full_image_paths = []
-                            for img_name in selected_images:
-                                full_path = next(f for f in image_files if os.path.basename(f) == img_name)
-                                full_image_paths.append(full_path)
-                                
-                            video_path = video_engine.create_video(full_image_paths, full_audio_path, video_out_name)
+            try:
+                if source_type == "Generated Image":
+                    if selected_audio == "ORIGINAL":
+                        st.error("Cannot use 'Original YouTube Audio' with static images. Please select a Voiceover.")
                     else:
-                        # Process YouTube Clip
-                        with st.status("Fetching YouTube Clip...") as status:
-                            clip_path = downloader.download_video_clip(st.session_state.selected_yt_url, "temp_broll", start_time=clip_start, duration=clip_dur)
-                            if clip_path:
-                                status.update(label="Processing Video...", state="running")
-                                if selected_audio == "ORIGINAL":
-                                    video_path = video_engine.create_video_with_clip(clip_path, output_filename=video_out_name, keep_original_audio=True)
-                                else:
-                                    full_audio_path = next(f for f in audio_files if os.path.basename(f) == selected_audio)
-                                    video_path = video_engine.create_video_with_clip(clip_path, full_audio_path, video_out_name)
-                            else:
-                                video_path = None
-                    
-                    if video_path and os.path.exists(video_path):
-                        st.success(f"Video created successfully! Download it below.")
-                        st.video(video_path)
-                        with open(video_path, "rb") as f:
-                            st.download_button(label="📥 Download Video", data=f, file_name=f"{video_out_name}.mp4", mime="video/mp4")
-                    else:
-                        st.error("Failed to create video. Please check your source settings.")
-                except Exception as e:
-                    st.error("Error occurred. Check settings or URL.")
-                    with st.expander("Technical Details"):
-                        st.code(str(e))
+                        full_audio_path = audio_files[selected_audio]["path"]
+                        
+                        # Get full paths for all selected images
+                        full_image_paths = [image_files[media_id]["path"] for media_id in selected_images]
+                            
+                        st.session_state.video_job = jobs.submit("slideshow", image_paths=full_image_paths, audio_path=full_audio_path, output_filename=video_out_name, profile=video_profile)
+                else:
+                    # Download and render the YouTube clip in the background
+                    full_audio_path = None
+                    if selected_audio != "ORIGINAL":
+                        full_audio_path = audio_files[selected_audio]["path"]
+                    st.session_state.video_job = jobs.submit("clip_video", url=st.session_state.selected_yt_url, start_time=clip_start,
+                                                             duration=clip_dur, audio_path=full_audio_path, output_filename=video_out_name, profile=video_profile)
+            except Exception as e:
+                st.error("Error occurred. Check settings or URL.")
+                with st.expander("Technical Details"):
+                    st.code(str(e))
         else:
             st.error("Please ensure all sources are selected correctly.")
 
+    if 'video_job' in st.session_state:
+        show_job_status(st.session_state.video_job, "📥 Download Video", "video_job")
+
 with tab7:
     st.header("🎞️ Video Editor (Beta)")
     st.write("Post-process your videos: Trim, Speed Up/Down, Add Text.")
     
     # 1. Select Video
-    video_files = glob.glob("content/videos/*.mp4") + glob.glob("content/videos/edited/*.mp4")
-    # Sort by modification time to show newest first
-    try:
-        video_files.sort(key=os.path.getmtime, reverse=True)
-    except:
-        pass
+    # Newest first, straight from the media index
+    video_files = {item["id"]: item for item in media_library.list_media("video")}
         
     if video_files:
-        selected_edit_video = st.selectbox("Select Video to Edit", [os.path.basename(f) for f in video_files])
-        full_edit_path = next(f for f in video_files if os.path.basename(f) == selected_edit_video)
+        selected_edit_id = st.selectbox("Select Video to Edit", list(video_files),
+                                        format_func=lambda media_id: media_library.label(video_files[media_id]))
+        selected_video = video_files[selected_edit_id]
+        full_edit_path = selected_video["path"]
+        selected_edit_video = selected_video["name"]
         
-        st.video(full_edit_path)
+        st.video(media_server.media_url(full_edit_path) or full_edit_path)
+        if selected_video["duration"]:
+            st.caption(f"Duration: {selected_video['duration']:.1f}s · {selected_video['width']}x{selected_video['height']}")
         
         # 2. Controls
         st.divider()
@@ -299,8 +401,6 @@ with tab7:
         
         with col_e1:
             st.subheader("✂️ Trim & Speed")
-            # We need duration. Let's try to guess or just let user input numbers.
-            # Ideally we read metadata but lightweight way:
             st.info("Set start/end times. Leave End Time as 0 to keep until end.")
             edit_start = st.number_input("Start Time (sec)", min_value=0.0, value=0.0, step=0.5)
             edit_end = st.number_input("End Time (sec)", min_value=0.0, value=0.0, step=0.5)
@@ -315,38 +415,45 @@ with tab7:
                 overlay_color = st.color_picker("Text Color", "#FFFFFF")
             
         edit_out_name = st.text_input("Edited Filename", value=f"edited_{selected_edit_video.split('.')[0]}")
+        edit_profile = st.selectbox("Render Profile", RENDER_PROFILE_NAMES, index=RENDER_PROFILE_NAMES.index(video_engine.DEFAULT_PROFILE), key="edit_profile")
         
-        if st.button("RENDER EDITED VIDEO"):
-            with st.spinner("Processing video... (This may take a moment)"):
+        text_conf = None
+        if overlay_text:
+            text_conf = {
+                'text': overlay_text,
+                'fontsize': overlay_size,
+                'color': overlay_color,
+                'position': overlay_pos
+            }
+        edit_params = dict(
+            video_path=full_edit_path,
+            start_time=edit_start,
+            end_time=edit_end if edit_end > 0 else None,
+            text_overlay=text_conf,
+            speed=edit_speed,
+            output_filename=edit_out_name,
+        )
+        
+        col_b1, col_b2 = st.columns(2)
+        with col_b1:
+            # Renders against a cached low-res proxy: seconds instead of a full encode
+            if st.button("👁️ QUICK PREVIEW"):
                 try:
-                    text_conf = None
-                    if overlay_text:
-                        text_conf = {
-                            'text': overlay_text,
-                            'fontsize': overlay_size,
-                            'color': overlay_color,
-                            'position': overlay_pos
-                        }
-                    
-                    out_path = video_engine.process_video(
-                        full_edit_path,
-                        start_time=edit_start,
-                        end_time=edit_end if edit_end > 0 else None,
-                        text_overlay=text_conf,
-                        speed=edit_speed,
-                        output_filename=edit_out_name
-                    )
-                    
-                    if out_path and os.path.exists(out_path):
-                        st.success("Video Edited Successfully!")
-                        st.video(out_path)
-                        with open(out_path, "rb") as f:
-                            st.download_button(label="📥 Download Edited Video", data=f, file_name=f"{edit_out_name}.mp4", mime="video/mp4")
-                    else:
-                        st.error("Failed to save video.")
-                        
+                    st.session_state.edit_preview_job = jobs.submit("edit", preview=True, **edit_params)
+                except Exception as e:
+                    st.error(f"Error previewing video: {e}")
+        with col_b2:
+            if st.button("RENDER EDITED VIDEO"):
+                try:
+                    st.session_state.edit_job = jobs.submit("edit", profile=edit_profile, **edit_params)
                 except Exception as e:
                     st.error(f"Error editing video: {e}")
+        
+        if 'edit_preview_job' in st.session_state:
+            st.caption("Preview (low resolution)")
+            show_job_status(st.session_state.edit_preview_job, "📥 Download Preview", "edit_preview_job")
+        if 'edit_job' in st.session_state:
+            show_job_status(st.session_state.edit_job, "📥 Download Edited Video", "edit_job")
                     
     else:
         st.info("No videos found in content/videos to edit. Create one in the Video Creator tab first!")
@@ -0,0 +1,36 @@
+import os
+import time
+import multiprocessing
+
+from disk_cache import DiskCache, make_key
+
+def build_once(root, key, log_path):
+    """Builds key's entry unless another process already has (what downloader does per clip)."""
+    cache = DiskCache(root, 10 * 1024 * 1024)
+    with cache.lock(key):
+        if cache.get(key):
+            return
+        with open(log_path, "a") as f:
+            f.write(f"{os.getpid()}\n")
+        time.sleep(0.2)
+        tmp_path = cache.temp_path(".bin")
+        with open(tmp_path, "wb") as f:
+            f.write(b"clip")
+        cache.put(key, tmp_path, suffix=".bin", move=True)
+
+def test_lock_builds_an_entry_once_across_processes(tmp_path):
+    root = str(tmp_path / "cache")
+    log_path = str(tmp_path / "builds.log")
+    key = make_key("clip", "abc", 0.0, 10.0)
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=build_once, args=(root, key, log_path)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    with open(log_path) as f:
+        assert len(f.read().split()) == 1
+    assert DiskCache(root, 10 * 1024 * 1024).get(key)
+    assert not [name for name in os.listdir(root) if name.endswith(".lock")]
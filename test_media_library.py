@@ -0,0 +1,44 @@
+import os
+import shutil
+
+import pytest
+
+import ffmpeg_tools
+import media_library
+
+def _has_ffmpeg():
+    try:
+        return bool(ffmpeg_tools.get_ffmpeg_exe())
+    except Exception:
+        return False
+
+pytestmark = pytest.mark.skipif(not _has_ffmpeg(), reason="needs ffmpeg")
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    """Points the index at a temp sqlite file and indexes tmp_path/audio."""
+    monkeypatch.setattr(media_library, "MEDIA_DB", str(tmp_path / "media.sqlite"))
+    monkeypatch.setattr(media_library, "THUMB_DIR", str(tmp_path / "thumbs"))
+    monkeypatch.setattr(media_library, "MEDIA_ROOTS", [(str(tmp_path / "audio"), "*.mp3", "audio")])
+    monkeypatch.setattr(media_library, "_db_ready", False)
+    monkeypatch.setattr(media_library, "_dir_mtimes", {})
+    monkeypatch.setattr(media_library, "_last_scan", 0.0)
+    os.makedirs(tmp_path / "audio")
+    return tmp_path
+
+def tone(path, seconds):
+    ffmpeg_tools.run_ffmpeg(["-f", "lavfi", "-i", f"sine=duration={seconds}", path])
+
+def test_in_place_overwrite_is_reindexed(library, monkeypatch):
+    voice = str(library / "audio" / "voice.mp3")
+    tone(voice, 2)
+    assert [round(item["duration"]) for item in media_library.list_media("audio")] == [2]
+
+    # What run_tts does on a cache hit: the directory's mtime stays the same
+    dir_mtime = os.stat(library / "audio").st_mtime_ns
+    tone(str(library / "longer.mp3"), 5)
+    shutil.copyfile(library / "longer.mp3", voice)
+    os.utime(library / "audio", ns=(dir_mtime, dir_mtime))
+
+    monkeypatch.setattr(media_library, "_last_scan", 0.0)
+    assert [round(item["duration"]) for item in media_library.list_media("audio")] == [5]
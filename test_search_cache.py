@@ -0,0 +1,64 @@
+import pytest
+
+import downloader
+
+def fake_results(query, start, count):
+    return [{"title": f"{query} #{i}", "url": f"https://www.youtube.com/watch?v=fake{i}"} for i in range(start, start + count)]
+
+@pytest.fixture
+def calls(tmp_path, monkeypatch):
+    """Points the search cache at a temp sqlite file and returns the fake extractor's call log."""
+    monkeypatch.setattr(downloader, "SEARCH_CACHE_DB", str(tmp_path / "search.sqlite"))
+    monkeypatch.setattr(downloader, "_search_cache", None)
+    log = []
+
+    def extractor(query, start, count):
+        log.append((query, start, count))
+        return fake_results(query, start, count)
+
+    # Stands in for yt-dlp, so nothing goes over the network
+    monkeypatch.setattr(downloader, "_ytdlp_search", extractor)
+    return log
+
+def test_paging_only_fetches_missing_results(calls):
+    first = downloader.search_youtube_page("cats", page=0, page_size=3)
+    second = downloader.search_youtube_page("cats", page=1, page_size=3)
+    assert [r["url"][-5:] for r in first + second] == [f"fake{i}" for i in range(6)]
+    assert calls == [("cats", 0, 3), ("cats", 3, 3)]
+    # Both pages are cached now
+    assert downloader.search_youtube_page("cats", page=0, page_size=3) == first
+    assert len(calls) == 2
+
+def test_normalized_queries_share_an_entry(calls):
+    downloader.search_youtube_links("Funny  Cats", max_results=2)
+    downloader.search_youtube_links("  funny cats ", max_results=2)
+    assert len(calls) == 1
+
+def test_results_persist_across_processes(calls, monkeypatch):
+    downloader.search_youtube_links("cats", max_results=2)
+    # A new process starts with an empty in-memory cache but the same sqlite file
+    monkeypatch.setattr(downloader, "_search_cache", None)
+    assert len(downloader.search_youtube_links("cats", max_results=2)) == 2
+    assert len(calls) == 1
+
+def test_expired_results_are_fetched_again(calls, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(downloader.time, "time", lambda: now[0])
+    downloader.search_youtube_links("cats", max_results=2)
+    now[0] += downloader.SEARCH_CACHE_TTL - 1
+    downloader.search_youtube_links("cats", max_results=2)
+    assert len(calls) == 1
+    now[0] += 2
+    downloader.search_youtube_links("cats", max_results=2)
+    assert calls[-1] == ("cats", 0, 2)
+    assert len(calls) == 2
+
+def test_explicit_extractor_and_failures(calls):
+    results = downloader.search_youtube_links("dogs", max_results=2, extractor=lambda q, start, count: fake_results(q, start, count))
+    assert results == fake_results("dogs", 0, 2)
+    # Nothing is cached when the search fails
+    def broken(query, start, count):
+        raise RuntimeError("offline")
+    assert downloader.search_youtube_links("birds", extractor=broken) == []
+    assert downloader.get_search_cache().get("birds") is None
+    assert calls == []
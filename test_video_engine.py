@@ -0,0 +1,94 @@
+import pytest
+
+import ffmpeg_tools
+import video_engine
+
+def _has_ffmpeg():
+    try:
+        return ffmpeg_tools.has_encoder("libx264")
+    except Exception:
+        return False
+
+pytestmark = pytest.mark.skipif(not _has_ffmpeg(), reason="needs ffmpeg with libx264")
+
+# Lossless x264, so decoded frames can be compared between renders
+LOSSLESS = dict(video_engine.get_profile("standard"), preset="ultrafast", crf=0)
+
+@pytest.fixture
+def source(tmp_path):
+    """7 s of 30 fps test pattern (every frame differs) with a sine soundtrack."""
+    path = str(tmp_path / "source.mp4")
+    ffmpeg_tools.run_ffmpeg([
+        "-f", "lavfi", "-i", "testsrc=size=320x240:rate=30", "-f", "lavfi", "-i", "sine=frequency=440",
+        "-t", "7", "-c:v", "libx264", "-g", "30", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", path,
+    ])
+    return path
+
+def frame_hashes(path):
+    result = ffmpeg_tools.run_ffmpeg(["-i", path, "-map", "0:v:0", "-f", "framemd5", "-"])
+    return [line.split(",")[-1].strip() for line in result.stdout.splitlines() if line and not line.startswith("#")]
+
+def render_both_ways(monkeypatch, render):
+    """Returns the frame hashes of a serial render and of the same render split into segments."""
+    monkeypatch.setattr(video_engine, "SEGMENT_MIN_SECONDS", 1)
+    monkeypatch.setattr(video_engine, "_cpu_share", lambda: 4)
+    monkeypatch.setattr(video_engine, "RENDER_SEGMENTS", 1)
+    serial = frame_hashes(render("serial.mp4"))
+    monkeypatch.setattr(video_engine, "RENDER_SEGMENTS", 3)
+    segmented = frame_hashes(render("segmented.mp4"))
+    return serial, segmented
+
+def test_segmented_clip_render_matches_serial(source, tmp_path, monkeypatch):
+    def render(name):
+        output_path = str(tmp_path / name)
+        return video_engine._render_clip_ffmpeg(source, None, output_path, True, LOSSLESS, str(tmp_path))
+
+    serial, segmented = render_both_ways(monkeypatch, render)
+    assert len(serial) == 7 * 24
+    assert segmented == serial
+
+def test_segmented_edit_matches_serial(source, tmp_path, monkeypatch):
+    def render(name):
+        output_path = str(tmp_path / name)
+        return video_engine._transcode_edit(source, output_path, 0.7, 6.7, None, 1.5, LOSSLESS)
+
+    serial, segmented = render_both_ways(monkeypatch, render)
+    assert len(serial) == 4 * 24
+    assert segmented == serial
+
+@pytest.fixture
+def gop_source(tmp_path):
+    """8 s of 30 fps x264 with settings unlike ours (CAVLC, main, 5 refs) and a keyframe every 2 s."""
+    path = str(tmp_path / "gop_source.mp4")
+    ffmpeg_tools.run_ffmpeg([
+        "-f", "lavfi", "-i", "testsrc=size=320x240:rate=30", "-f", "lavfi", "-i", "sine=frequency=440",
+        "-t", "8", "-c:v", "libx264", "-profile:v", "main", "-crf", "28", "-pix_fmt", "yuv420p",
+        "-x264-params", "cabac=0:ref=5:keyint=60:min-keyint=60:scenecut=0", "-c:a", "aac", "-shortest", path,
+    ])
+    return path
+
+def test_smart_cut_keeps_source_parameter_sets(gop_source, tmp_path):
+    info = ffmpeg_tools.probe_media(gop_source)
+    keyframes = ffmpeg_tools.keyframe_times(gop_source)
+    assert video_engine.plan_edit(info, keyframes, 1.3, 6.5) == "smartcut"
+    output_path = str(tmp_path / "cut.mp4")
+    video_engine._smart_cut(gop_source, output_path, 1.3, 6.5, info, keyframes, video_engine.get_profile())
+
+    assert ffmpeg_tools.h264_parameter_sets(output_path) == ffmpeg_tools.h264_parameter_sets(gop_source)
+    assert ffmpeg_tools.decode_check(output_path) == 156
+    # The copied GOPs (source frames 60..179) decode exactly as in the source
+    assert frame_hashes(output_path)[21:141] == frame_hashes(gop_source)[60:180]
+
+def test_smart_cut_falls_back_for_unknown_encoders(gop_source, tmp_path, monkeypatch):
+    # Without x264's settings SEI the source's parameter sets can't be reproduced
+    anonymous = str(tmp_path / "anonymous.mp4")
+    ffmpeg_tools.run_ffmpeg(["-i", gop_source, "-c", "copy", "-bsf:v", "filter_units=remove_types=6", anonymous])
+    info = ffmpeg_tools.probe_media(anonymous)
+    keyframes = ffmpeg_tools.keyframe_times(anonymous)
+    with pytest.raises(Exception):
+        video_engine._smart_cut(anonymous, str(tmp_path / "cut.mp4"), 1.3, 6.5, info, keyframes, video_engine.get_profile())
+
+    monkeypatch.chdir(tmp_path)
+    output_path = video_engine.process_video(anonymous, 1.3, 6.5, output_filename="cut")
+    # Transcoded at the standard profile's 24 fps instead
+    assert ffmpeg_tools.decode_check(output_path) == round(5.2 * 24)
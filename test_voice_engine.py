@@ -0,0 +1,47 @@
+import sys
+import types
+
+import pytest
+
+import voice_engine
+
+class FakeCommunicate:
+    """edge_tts.Communicate stand-in: two MP3 'chunks' and a WordBoundary per word."""
+    calls = 0
+
+    def __init__(self, text, voice, rate="+0%", pitch="+0Hz", boundary=None):
+        self.words = text.split()
+        FakeCommunicate.calls += 1
+
+    async def stream(self):
+        for i, word in enumerate(self.words):
+            yield {"type": "audio", "data": b"\xff\xfb" + word.encode()}
+            yield {"type": "WordBoundary", "offset": i * 5_000_000, "duration": 4_000_000, "text": word}
+
+@pytest.fixture(autouse=True)
+def offline_tts(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "edge_tts", types.SimpleNamespace(Communicate=FakeCommunicate))
+    monkeypatch.setattr(voice_engine, "TTS_CACHE_DIR", str(tmp_path / "tts"))
+    monkeypatch.setattr(voice_engine, "_tts_cache", None)
+    monkeypatch.chdir(tmp_path)
+    FakeCommunicate.calls = 0
+
+def test_cached_voiceover_keeps_its_subtitles():
+    events = list(voice_engine.stream_tts("Hello there world.", "Female (Ava)", "first"))
+    done = events[-1]
+    assert not done["cached"]
+    with open(done["srt_path"], encoding="utf-8") as f:
+        subtitles = f.read()
+    assert "Hello there world." in subtitles
+
+    cached = list(voice_engine.stream_tts("Hello   there world.", "Female (Ava)", "second"))[-1]
+    assert cached["cached"]
+    assert FakeCommunicate.calls == 1
+    with open(cached["srt_path"], encoding="utf-8") as f:
+        assert f.read() == subtitles
+
+def test_run_tts_stores_and_restores_timings():
+    voice_engine.run_tts("One two three.", "Female (Ava)", "batch_voice")
+    events = list(voice_engine.stream_tts("One two three.", "Female (Ava)", "page_voice"))
+    assert FakeCommunicate.calls == 1
+    assert events[-1]["cached"] and events[-1]["srt_path"].endswith("page_voice.srt")
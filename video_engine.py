@@ -1,145 +1,1251 @@
-from moviepy.editor import ImageClip, AudioFileClip, VideoFileClip, concatenate_videoclips
 import os
+import math
+import uuid
+import shutil
+import hashlib
+import tempfile
+import threading
+import contextlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import ffmpeg_tools
+from disk_cache import DiskCache, make_key
 
-def create_video_with_clip(clip_path, audio_path=None, output_filename="final_video", keep_original_audio=False):
+# Codecs that can go into our MP4 outputs as-is, without a re-encode
+STREAM_COPY_VIDEO_CODECS = ("h264",)
+STREAM_COPY_AUDIO_CODECS = ("aac",)
+
+SLIDESHOW_FPS = 24
+
+# Long encodes are split into segments rendered by parallel ffmpeg processes.
+# Each segment covers at least SEGMENT_MIN_SECONDS of output.
+RENDER_SEGMENTS = int(os.environ.get("RENDER_SEGMENTS", str(min(8, os.cpu_count() or 1))))
+SEGMENT_MIN_SECONDS = 30
+
+# Seconds decoded before a segment's start so the frame showing at that instant is available
+SEGMENT_PREROLL = 1.0
+
+# Per-render temp files go here (e.g. a tmpfs like /dev/shm); default is the system temp dir
+RENDER_SCRATCH_DIR = os.environ.get("RENDER_SCRATCH_DIR") or None
+
+# Named quality/speed profiles used by every encode.
+# threads=0 lets x264 pick; max_height/fps None keep the source value.
+RENDER_PROFILES = {
+    "draft": {"preset": "ultrafast", "crf": 30, "threads": 0, "max_height": 480, "fps": 15, "audio_bitrate": "96k"},
+    "standard": {"preset": "veryfast", "crf": 23, "threads": 0, "max_height": 1080, "fps": 24, "audio_bitrate": "128k"},
+    "archival": {"preset": "slow", "crf": 18, "threads": 0, "max_height": None, "fps": 24, "audio_bitrate": "192k"},
+}
+DEFAULT_PROFILE = "standard"
+
+# MoviePy fallback: clips whose decoded frames fit in this budget are decoded once and looped from memory
+LOOP_FRAME_CACHE_MB = int(os.environ.get("LOOP_FRAME_CACHE_MB", "256"))
+
+# Open MoviePy readers kept for reuse across renders (same b-roll/voiceover); 0 disables pooling
+READER_POOL_SIZE = int(os.environ.get("READER_POOL_SIZE", "0"))
+
+# Low-res proxies used for fast edit previews, cached per source file
+PROXY_CACHE_DIR = os.environ.get("PROXY_CACHE_DIR", "content/cache/proxies")
+PROXY_CACHE_MAX_MB = int(os.environ.get("PROXY_CACHE_MAX_MB", "2000"))
+PROXY_HEIGHT = 360
+PROXY_FPS = 12
+
+# Slideshow images decoded and letterboxed to the canvas once, cached by (content hash, size)
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", "content/cache/images")
+IMAGE_CACHE_MAX_MB = int(os.environ.get("IMAGE_CACHE_MAX_MB", "1000"))
+
+# Text overlays are rasterized once to RGBA PNGs and reused across renders
+OVERLAY_CACHE_DIR = os.environ.get("OVERLAY_CACHE_DIR", "content/cache/overlays")
+OVERLAY_CACHE_MAX_MB = int(os.environ.get("OVERLAY_CACHE_MAX_MB", "100"))
+OVERLAY_FONT = "Arial"
+OVERLAY_FONT_FALLBACKS = ("arial.ttf", "Arial.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf")
+OVERLAY_STROKE_COLOR = "black"
+OVERLAY_STROKE_WIDTH = 2
+
+# Smart-cut re-encodes boundary GOPs with the source's x264 settings; these are the ones
+# that shape the SPS/PPS (x264's SEI name -> x264-params name)
+X264_HEADER_OPTIONS = {
+    "cabac": "cabac",
+    "ref": "ref",
+    "8x8dct": "8x8dct",
+    "bframes": "bframes",
+    "b_pyramid": "b-pyramid",
+    "weightb": "weightb",
+    "weightp": "weightp",
+    "keyint": "keyint",
+    "keyint_min": "min-keyint",
+    "chroma_qp_offset": "chroma-qp-offset",
+    "constrained_intra": "constrained-intra",
+    "bluray_compat": "bluray-compat",
+}
+H264_PROFILES = {66: "baseline", 77: "main", 100: "high"}
+
+# MoviePy-style named positions -> ffmpeg overlay x:y expressions
+OVERLAY_POSITIONS = {
+    "center": ("(W-w)/2", "(H-h)/2"),
+    "top": ("(W-w)/2", "0"),
+    "north": ("(W-w)/2", "0"),
+    "bottom": ("(W-w)/2", "H-h"),
+    "south": ("(W-w)/2", "H-h"),
+    "west": ("0", "(H-h)/2"),
+    "left": ("0", "(H-h)/2"),
+    "east": ("W-w", "(H-h)/2"),
+    "right": ("W-w", "(H-h)/2"),
+}
+
+_proxy_cache = None
+_overlay_cache = None
+_image_cache = None
+_image_hashes = {}
+_reader_pool = None
+# Count of renders running across a process pool (a multiprocessing.Value shared by its
+# workers, see set_render_counter); None counts only this process's render
+_running_renders = None
+
+def get_profile(name=None):
+    """Returns the render profile dict (with its 'name') for a profile name."""
+    name = name or DEFAULT_PROFILE
+    if name not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile: {name}")
+    return dict(RENDER_PROFILES[name], name=name)
+
+def _metadata_args(profile):
+    # Recorded in the MP4 so outputs show which profile produced them
+    return ["-metadata", f"comment=render_profile={profile['name']}"]
+
+def _video_encode_args(profile, fps=None, threads=None):
+    threads = profile["threads"] if threads is None else threads
+    args = ["-c:v", "libx264", "-preset", profile["preset"], "-crf", str(profile["crf"]),
+            "-threads", str(threads), "-pix_fmt", "yuv420p"]
+    fps = profile["fps"] or fps
+    if fps:
+        args += ["-r", str(fps)]
+    return args
+
+def _audio_encode_args(profile):
+    return ["-c:a", "aac", "-b:a", profile["audio_bitrate"]]
+
+def _moviepy_write_kwargs(profile):
+    return {
+        "fps": profile["fps"] or SLIDESHOW_FPS,
+        "codec": "libx264",
+        "audio_codec": "aac",
+        "preset": profile["preset"],
+        "threads": profile["threads"] or os.cpu_count(),
+        "audio_bitrate": profile["audio_bitrate"],
+        "ffmpeg_params": ["-crf", str(profile["crf"])] + _metadata_args(profile),
+    }
+
+def _cap_clip_height(clip, profile):
+    if profile["max_height"] and clip.h > profile["max_height"]:
+        return clip.resized(height=profile["max_height"])
+    return clip
+
+class RenderCancelled(Exception):
+    """Raised by a progress callback to stop a render."""
+
+def _load_moviepy():
     """
-    Creates a video from a clip. Can merge with new audio or keep original.
+    Imports MoviePy on first use (only the fallback renderers need it), after
+    pointing it at our ffmpeg binary, and returns moviepy.editor.
     """
-    output_dir = "content/videos"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        
-    output_path = os.path.join(output_dir, f"{output_filename}.mp4")
+    ffmpeg_tools.configure_moviepy()
+    import moviepy.editor
+    return moviepy.editor
+
+def _moviepy_logger(progress):
+    if not progress:
+        return "bar"
+    import proglog
+
+    class _ProgressLogger(proglog.ProgressBarLogger):
+        """Forwards MoviePy's frame progress to a progress(fraction) callback."""
+
+        def bars_callback(self, bar, attr, value, old_value=None):
+            if attr == "index" and bar in ("t", "frame_index"):
+                total = self.bars[bar].get("total")
+                if total:
+                    progress(min(1.0, value / total))
+
+    return _ProgressLogger()
+
+def _open_reader(kind, path):
+    mp = _load_moviepy()
+    return (mp.VideoFileClip if kind == "video" else mp.AudioFileClip)(path)
+
+class ClipReaderPool:
+    """
+    Bounded LRU of idle VideoFileClip/AudioFileClip readers, keyed by file version.
+    A reader is leased to one render at a time; concurrent renders of the same file
+    get their own reader. Readers beyond max_open, or used by a failed render, are closed.
+    """
+
+    def __init__(self, max_open):
+        self.max_open = max_open
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, kind, path):
+        stat = os.stat(path)
+        return (kind, os.path.abspath(path), stat.st_size, stat.st_mtime)
+
+    @contextlib.contextmanager
+    def lease(self, kind, path):
+        key = self._key(kind, path)
+        with self._lock:
+            clip = self._idle.pop(key, None)
+        if clip is None:
+            clip = _open_reader(kind, path)
+        try:
+            yield clip
+        except BaseException:
+            clip.close()
+            raise
+        self._release(key, clip)
+
+    def _release(self, key, clip):
+        to_close = []
+        with self._lock:
+            if key in self._idle:
+                to_close.append(clip)
+            else:
+                self._idle[key] = clip
+            while len(self._idle) > self.max_open:
+                to_close.append(self._idle.popitem(last=False)[1])
+        for old in to_close:
+            old.close()
+
+    def close_all(self):
+        with self._lock:
+            clips = list(self._idle.values())
+            self._idle.clear()
+        for clip in clips:
+            clip.close()
+
+def get_reader_pool():
+    global _reader_pool
+    if _reader_pool is None:
+        _reader_pool = ClipReaderPool(READER_POOL_SIZE)
+    return _reader_pool
+
+@contextlib.contextmanager
+def open_clip(kind, path):
+    """
+    Opens a 'video' or 'audio' clip for the duration of the with-block and closes
+    its ffmpeg reader afterwards (or returns it to the reader pool if enabled).
+    """
+    if READER_POOL_SIZE > 0:
+        with get_reader_pool().lease(kind, path) as clip:
+            yield clip
+        return
+    clip = _open_reader(kind, path)
+    try:
+        yield clip
+    finally:
+        clip.close()
+
+def _make_workspace(prefix="render-"):
+    """Creates a private temp directory for one render on the scratch volume."""
+    if RENDER_SCRATCH_DIR and not os.path.exists(RENDER_SCRATCH_DIR):
+        os.makedirs(RENDER_SCRATCH_DIR, exist_ok=True)
+    return tempfile.mkdtemp(prefix=prefix, dir=RENDER_SCRATCH_DIR)
+
+def _publish(tmp_path, output_path):
+    """
+    Moves a finished render to output_path atomically: it is staged next to the
+    target (a copy if the scratch volume is another filesystem) and renamed over it,
+    so readers never see a half-written file.
+    """
+    output_dir = os.path.dirname(output_path) or "."
+    staged = os.path.join(output_dir, f".{os.path.basename(output_path)}.{uuid.uuid4().hex}.part")
+    try:
+        shutil.move(tmp_path, staged)
+        os.replace(staged, output_path)
+    except Exception:
+        if os.path.exists(staged):
+            os.remove(staged)
+        raise
+    return output_path
+
+def _render_and_publish(output_path, prefix, render):
+    """
+    Runs render(work_output, workspace) inside a private workspace, then moves the
+    finished file to output_path (creating its directory) with _publish. The
+    workspace is always removed.
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    workspace = _make_workspace(prefix)
+    try:
+        work_output = os.path.join(workspace, os.path.basename(output_path))
+        with _render_slot():
+            render(work_output, workspace)
+        return _publish(work_output, output_path)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+def _progress_range(progress, start, end):
+    """Maps a step's 0..1 progress onto [start, end] of the overall render."""
+    if progress is None:
+        return None
+    return lambda fraction: progress(start + (end - start) * fraction)
+
+def _concat_entry(path):
+    # Quoting rules of the concat demuxer: ' is written as '\''
+    escaped = os.path.abspath(path).replace("'", "'\\''")
+    return f"file '{escaped}'\n"
+
+def _require_ffmpeg(encoders=(), filters=()):
+    """
+    Raises if the ffmpeg build lacks an encoder or filter a fast path needs,
+    so the caller falls back before starting an encode that cannot work.
+    """
+    missing = [name for name in encoders if not ffmpeg_tools.has_encoder(name)]
+    missing += [name for name in filters if not ffmpeg_tools.has_filter(name)]
+    if missing:
+        raise Exception(f"ffmpeg build lacks: {', '.join(missing)}")
+
+def _output_fps(profile, fps=None):
+    """Frame rate an encode actually produces (the profile's, else the source's)."""
+    return profile["fps"] or fps or SLIDESHOW_FPS
+
+def set_render_counter(counter):
+    """
+    Process pool initializer: shares the pool's count of running renders (a
+    multiprocessing.Value('i')) with this worker.
+    """
+    global _running_renders
+    _running_renders = counter
+
+@contextlib.contextmanager
+def _render_slot():
+    """Counts this render as running for the duration of the with-block."""
+    if _running_renders is None:
+        yield
+        return
+    with _running_renders.get_lock():
+        _running_renders.value += 1
+    try:
+        yield
+    finally:
+        with _running_renders.get_lock():
+            _running_renders.value -= 1
+
+def _concurrent_renders():
+    if _running_renders is None:
+        return 1
+    return max(1, _running_renders.value)
+
+def _cpu_share():
+    """Cores this render may use: all of them when it runs alone, else an even split."""
+    return max(1, (os.cpu_count() or 1) // _concurrent_renders())
+
+def _timeline_segment(path, start_time, speed, out_fps, seg_start, seg_len):
+    """
+    Returns (input_args, filter_chain) for output frames [seg_start, seg_start + seg_len)
+    of a timeline that plays path from start_time at speed. Decoding starts
+    SEGMENT_PREROLL before the segment; setpts maps source time onto the output
+    timeline and the fps filter samples it on the frame grid a serial render uses (its
+    pts are frame numbers), so trimming to the segment's frames gives identical frames
+    whether or not the render is split. tpad holds the last frame if the video stream
+    ends early; -frames:v cuts the output at the right length.
+    """
+    src_start = start_time + seg_start * speed
+    seek = max(0.0, src_start - SEGMENT_PREROLL)
+    first = int(round(seg_start * out_fps))
+    last = first + int(round(seg_len * out_fps))
+    inputs = ["-ss", f"{seek:.6f}", "-t", f"{src_start - seek + (seg_len + SEGMENT_PREROLL) * speed:.6f}", "-i", path]
+    chain = [f"setpts=(PTS{seek - start_time:+.6f}/TB)/{speed}", f"fps={out_fps}",
+             f"trim=start_pts={first}:end_pts={last}", "setpts=PTS-STARTPTS",
+             f"tpad=stop_mode=clone:stop_duration={seg_len:.6f}"]
+    return inputs, ",".join(chain)
+
+def _check_frame_count(path, expected):
+    rendered = ffmpeg_tools.count_frames(path)
+    if rendered != expected:
+        raise Exception(f"{os.path.basename(path)} has {rendered} video frames, expected {expected}")
+    return path
+
+def _segment_count(duration, segments=None):
+    segments = RENDER_SEGMENTS if segments is None else segments
+    return max(1, min(segments, _cpu_share(), int(duration // SEGMENT_MIN_SECONDS)))
+
+def _encode_timeline(video_args, audio_args, duration, fps, output_path, profile, progress=None,
+                     extra_video_args=(), segments=None):
+    """
+    Encodes `duration` seconds of output with x264 + AAC.
+
+    video_args(seg_start, seg_len) returns (input_args, output_args): the ffmpeg inputs
+    and the filter/map options that produce the video for that part of the output
+    timeline (output time, in seconds). audio_args(input_index) returns
+    (input_args, map_args) for the audio track, where input_index is the position its
+    first input will get. Inputs always come before output options on the command line.
+
+    Short renders are a single ffmpeg pass. Long ones are split at frame boundaries
+    into segments encoded by parallel ffmpeg processes, joined with the concat
+    demuxer (no re-encode) and muxed with the audio once, so the frame count and
+    timing match the serial render exactly. The output's frame count is checked
+    before it is returned, so a short video track raises (and the caller falls back).
+    """
+    n_segments = _segment_count(duration, segments)
+    out_fps = _output_fps(profile, fps)
+    total_frames = int(round(duration * out_fps))
+
+    if n_segments == 1:
+        v_inputs, v_outputs = video_args(0.0, duration)
+        a_inputs, a_maps = audio_args(v_inputs.count("-i"))
+        # With other renders running, x264 gets this render's share of the cores instead of all of them
+        threads = _cpu_share() if _concurrent_renders() > 1 else None
+        ffmpeg_tools.run_ffmpeg(
+            v_inputs + a_inputs + v_outputs + a_maps
+            + _video_encode_args(profile, fps=fps, threads=threads) + list(extra_video_args)
+            + _audio_encode_args(profile) + _metadata_args(profile)
+            + ["-frames:v", str(total_frames), "-t", f"{duration:.6f}", "-movflags", "+faststart", output_path],
+            progress=progress, duration=duration,
+        )
+        return _check_frame_count(output_path, total_frames)
+
+    frames_per_segment = math.ceil(total_frames / n_segments)
+    threads_per_segment = max(1, _cpu_share() // n_segments)
+
+    done = {}
+    done_lock = threading.Lock()
+
+    def segment_progress(index, seg_len):
+        def report(fraction):
+            if progress:
+                with done_lock:
+                    done[index] = fraction * seg_len
+                    total = sum(done.values())
+                progress(min(1.0, total / duration))
+        return report
+
+    work_dir = _make_workspace("segments-")
+    try:
+        jobs = []
+        for i in range(n_segments):
+            first_frame = i * frames_per_segment
+            n_frames = min(frames_per_segment, total_frames - first_frame)
+            if n_frames <= 0:
+                break
+            seg_start = first_frame / out_fps
+            seg_len = n_frames / out_fps
+            seg_path = os.path.join(work_dir, f"seg_{i:03d}.mp4")
+            v_inputs, v_outputs = video_args(seg_start, seg_len)
+            args = (v_inputs + v_outputs
+                    + _video_encode_args(profile, fps=fps, threads=threads_per_segment) + list(extra_video_args)
+                    + ["-an", "-frames:v", str(n_frames), "-video_track_timescale", "90000", seg_path])
+            jobs.append((seg_path, args, segment_progress(i, seg_len), seg_len))
+
+        with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+            futures = [pool.submit(ffmpeg_tools.run_ffmpeg, args, report if progress else None, seg_len)
+                       for _, args, report, seg_len in jobs]
+            for future in futures:
+                future.result()
+
+        list_path = os.path.join(work_dir, "segments.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for seg_path, _, _, _ in jobs:
+                f.write(f"file '{os.path.basename(seg_path)}'\n")
+        video_only = os.path.join(work_dir, "video.mp4")
+        ffmpeg_tools.run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", video_only])
+
+        a_inputs, a_maps = audio_args(1)
+        ffmpeg_tools.run_ffmpeg(
+            ["-i", video_only] + a_inputs + ["-map", "0:v:0"] + a_maps
+            + ["-c:v", "copy"] + _audio_encode_args(profile) + _metadata_args(profile)
+            + ["-t", f"{duration:.6f}", "-movflags", "+faststart", output_path]
+        )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return _check_frame_count(output_path, total_frames)
+
+def _loop_by_concat(unit_path, unit_duration, audio_path, duration, output_path, work_dir, profile, progress=None):
+    """
+    Extends unit_path to `duration` seconds by repeating it with the concat demuxer
+    (packets are copied, nothing is decoded or encoded) and muxes the voiceover once.
+    """
+    repeats = math.ceil(duration / unit_duration)
+    list_path = os.path.join(work_dir, "loop.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        f.write(_concat_entry(unit_path) * repeats)
+
+    if ffmpeg_tools.probe_media(audio_path)["audio_codec"] in STREAM_COPY_AUDIO_CODECS:
+        audio_args = ["-c:a", "copy"]
+    else:
+        audio_args = _audio_encode_args(profile)
+    ffmpeg_tools.run_ffmpeg([
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", "copy",
+        *audio_args,
+        *_metadata_args(profile),
+        "-t", f"{duration:.6f}",
+        "-movflags", "+faststart",
+        output_path,
+    ], progress=progress, duration=duration)
+    return output_path
+
+def _stream_copy_clip(clip_path, audio_path, output_path, keep_original_audio, progress=None, profile=None, work_dir=None):
+    """
+    Muxes the clip's existing streams into the output without decoding frames.
+    Returns True if the fast path was used, False if a full render is needed.
+    """
+    profile = profile or get_profile()
+    clip_info = ffmpeg_tools.probe_media(clip_path)
+    if clip_info["video_codec"] not in STREAM_COPY_VIDEO_CODECS:
+        return False
+    if profile["max_height"] and (clip_info["height"] or 0) > profile["max_height"]:
+        # Profile asks for a smaller picture than the clip has
+        return False
+
+    if keep_original_audio or not audio_path:
+        if clip_info["audio_codec"] not in STREAM_COPY_AUDIO_CODECS + (None,):
+            return False
+        ffmpeg_tools.run_ffmpeg([
+            "-i", clip_path,
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-c", "copy",
+            *_metadata_args(profile),
+            "-movflags", "+faststart",
+            output_path,
+        ], progress=progress, duration=clip_info["duration"])
+        return True
+
+    audio_info = ffmpeg_tools.probe_media(audio_path)
+    if not clip_info["duration"] or not audio_info["duration"]:
+        return False
+    if clip_info["duration"] < audio_info["duration"]:
+        # Clip has to be looped to cover the voiceover: repeat its packets as they are
+        if not work_dir:
+            return False
+        _loop_by_concat(clip_path, clip_info["duration"], audio_path, audio_info["duration"],
+                        output_path, work_dir, profile, progress)
+        return True
+
+    # Copy the video stream, swap in the voiceover (audio-only encode is cheap)
+    if audio_info["audio_codec"] in STREAM_COPY_AUDIO_CODECS:
+        audio_args = ["-c:a", "copy"]
+    elif ffmpeg_tools.has_encoder("aac"):
+        audio_args = _audio_encode_args(profile)
+    else:
+        return False
+    ffmpeg_tools.run_ffmpeg([
+        "-i", clip_path,
+        "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", "copy",
+        *audio_args,
+        *_metadata_args(profile),
+        "-t", f"{audio_info['duration']:.3f}",
+        "-movflags", "+faststart",
+        output_path,
+    ], progress=progress, duration=audio_info["duration"])
+    return True
+
+def _render_clip_ffmpeg(clip_path, audio_path, output_path, keep_original_audio, profile, work_dir, progress=None):
+    """
+    Re-encodes a clip with ffmpeg. When it has to loop to cover a longer voiceover,
+    only one pass of the clip is encoded and it is repeated with the concat demuxer,
+    so the encode cost does not grow with the voiceover length.
+    """
+    needed_filters = ["setpts", "fps", "trim", "tpad"]
+    if profile["max_height"]:
+        needed_filters.append("scale")
+    _require_ffmpeg(encoders=("libx264", "aac"), filters=needed_filters)
+    clip_info = ffmpeg_tools.probe_media(clip_path)
+    if not clip_info["duration"]:
+        raise ValueError(f"Could not read clip duration: {clip_path}")
+    use_voiceover = not keep_original_audio and audio_path
+    duration = ffmpeg_tools.probe_media(audio_path)["duration"] if use_voiceover else clip_info["duration"]
+    loop = use_voiceover and clip_info["duration"] < duration
+    out_fps = _output_fps(profile, clip_info["fps"])
+
+    def video_args(seg_start, seg_len):
+        inputs, chain = _timeline_segment(clip_path, 0.0, 1.0, out_fps, seg_start, seg_len)
+        if profile["max_height"]:
+            chain += f",scale=-2:'min(ih,{profile['max_height']})'"
+        return inputs, ["-map", "0:v:0", "-vf", chain]
+
+    def audio_args(index):
+        if use_voiceover:
+            return ["-i", audio_path], ["-map", f"{index}:a:0"]
+        if clip_info["audio_codec"]:
+            return ["-i", clip_path], ["-map", f"{index}:a:0"]
+        return [], []
+
+    if loop:
+        unit_path = os.path.join(work_dir, "loop_unit.mp4")
+        _encode_timeline(video_args, lambda index: ([], []), clip_info["duration"], clip_info["fps"],
+                         unit_path, profile, _progress_range(progress, 0.0, 0.8))
+        unit_duration = ffmpeg_tools.probe_media(unit_path)["duration"] or clip_info["duration"]
+        return _loop_by_concat(unit_path, unit_duration, audio_path, duration, output_path, work_dir,
+                               profile, _progress_range(progress, 0.8, 1.0))
+
+    return _encode_timeline(video_args, audio_args, duration, clip_info["fps"], output_path, profile, progress)
+
+def _loop_in_memory(video, duration):
+    """
+    Loops a short clip from its frames, decoded once, instead of re-reading the file
+    on every pass. Returns None if the frames would not fit in LOOP_FRAME_CACHE_MB.
+    """
+    fps = video.fps or SLIDESHOW_FPS
+    n_frames = max(1, int(round(video.duration * fps)))
+    if n_frames * video.w * video.h * 3 > LOOP_FRAME_CACHE_MB * 1024 * 1024:
+        return None
+    frames = list(video.iter_frames(fps=fps))
+
+    def frame_at(t):
+        return frames[int(t * fps) % len(frames)]
+
+    return _load_moviepy().VideoClip(frame_at, duration=duration)
+
+def _create_video_with_clip_into(output_path, workspace, clip_path, audio_path, keep_original_audio, allow_stream_copy, progress, profile):
+    """Renders create_video_with_clip's output to output_path (inside workspace)."""
+    if allow_stream_copy:
+        try:
+            if _stream_copy_clip(clip_path, audio_path, output_path, keep_original_audio, progress, profile, workspace):
+                return output_path
+        except RenderCancelled:
+            raise
+        except Exception as e:
+            print(f"Stream copy failed: {e}. Falling back to full render...")
     
     try:
-        video = VideoFileClip(clip_path)
-        
-        if not keep_original_audio and audio_path:
-            # Replace audio
-            audio = AudioFileClip(audio_path)
-            video = video.without_audio().with_duration(audio.duration)
-            if video.duration < audio.duration:
-                # Loop video to match audio length
-                video = video.loop(duration=audio.duration)
-            final_video = video.with_audio(audio)
-        else:
-            # Keep original audio
-            final_video = video
+        return _render_clip_ffmpeg(clip_path, audio_path, output_path, keep_original_audio, profile, workspace, progress)
+    except RenderCancelled:
+        raise
+    except Exception as e:
+        print(f"ffmpeg render failed: {e}. Falling back to MoviePy...")
+    
+    try:
+        # Every reader opened below is closed when the block exits, even on error
+        with contextlib.ExitStack() as clips:
+            video = clips.enter_context(open_clip("video", clip_path))
             
-        final_video.write_videofile(output_path, fps=24, codec="libx264", audio_codec="aac", temp_audiofile='temp-video-audio.m4a', remove_temp=True)
-        return output_path
+            if not keep_original_audio and audio_path:
+                # Replace audio
+                audio = clips.enter_context(open_clip("audio", audio_path))
+                video = video.without_audio()
+                if video.duration < audio.duration:
+                    # Loop video to match audio length (from memory when the clip is short)
+                    video = _loop_in_memory(video, audio.duration) or video.loop(duration=audio.duration)
+                else:
+                    video = video.with_duration(audio.duration)
+                final_video = video.with_audio(audio)
+            else:
+                # Keep original audio
+                final_video = video
+                
+            final_video = _cap_clip_height(final_video, profile)
+            final_video.write_videofile(output_path, temp_audiofile=os.path.join(workspace, 'temp-audio.m4a'), remove_temp=True, logger=_moviepy_logger(progress), **_moviepy_write_kwargs(profile))
+            return output_path
     except Exception as e:
         import traceback
         error_msg = f"Error creating video with clip: {e}\n{traceback.format_exc()}"
         print(error_msg)
         raise Exception(error_msg)
 
-def create_video(image_paths, audio_path, output_filename):
+def create_video_with_clip(clip_path, audio_path=None, output_filename="final_video", keep_original_audio=False, allow_stream_copy=True, progress=None, profile=DEFAULT_PROFILE):
     """
-    Creates a video by merging image(s) and an audio file.
-    If multiple images are provided, they are displayed sequentially.
-    The total video duration matches the audio duration.
+    Creates a video from a clip. Can merge with new audio or keep original.
+    If the clip is already H.264/AAC, the streams are copied instead of re-encoded.
+    progress(fraction) is called while rendering; it may raise RenderCancelled to stop.
+    profile names an entry of RENDER_PROFILES.
     """
+    profile = get_profile(profile)
     output_dir = "content/videos"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
     output_path = os.path.join(output_dir, f"{output_filename}.mp4")
+    return _render_and_publish(output_path, "clip-", lambda work_output, workspace: _create_video_with_clip_into(
+        work_output, workspace, clip_path, audio_path, keep_original_audio, allow_stream_copy, progress, profile))
+
+def _even(value):
+    return int(value) // 2 * 2
+
+def _slideshow_canvas(image_paths, profile):
+    """
+    Canvas size the MoviePy 'compose' path would use (the largest width and height),
+    scaled down to the profile's max_height. Only the image headers are read.
+    """
+    from PIL import Image
+
+    width = height = 0
+    for img_path in image_paths:
+        with Image.open(img_path) as image:
+            width = max(width, image.width)
+            height = max(height, image.height)
+    if profile["max_height"] and height > profile["max_height"]:
+        width, height = width * profile["max_height"] / height, profile["max_height"]
+    return _even(width), _even(height)
+
+def get_image_cache():
+    global _image_cache
+    if _image_cache is None:
+        _image_cache = DiskCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB * 1024 * 1024)
+    return _image_cache
+
+def _file_hash(path):
+    """sha256 of a file's content, remembered per (path, size, mtime) for this process."""
+    stat = os.stat(path)
+    version = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    digest = _image_hashes.get(version)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(block)
+        digest = _image_hashes[version] = sha.hexdigest()
+    return digest
+
+def prepare_image(img_path, width, height):
+    """
+    Returns a cached PPM (raw RGB) of img_path letterboxed onto a width x height
+    black canvas: centered, scaled down to fit but never up. Keyed by content hash
+    and size, so an image reused across videos is decoded and scaled only once.
+    """
+    from PIL import Image
+
+    cache = get_image_cache()
+    key = make_key("frame", _file_hash(img_path), width, height)
+    cached_path = cache.get(key)
+    if cached_path:
+        return cached_path
+
+    with Image.open(img_path) as image:
+        image = image.convert("RGBA")
+    scale = min(1.0, width / image.width, height / image.height)
+    if scale < 1.0:
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+    canvas = Image.new("RGB", (width, height), (0, 0, 0))
+    canvas.paste(image, ((width - image.width) // 2, (height - image.height) // 2), image)
+    tmp_path = cache.temp_path(".ppm")
+    canvas.save(tmp_path, format="PPM")
+    return cache.put(key, tmp_path, suffix=".ppm", move=True, meta={"source": img_path})
+
+def load_prepared_image(ppm_path, width, height):
+    """Memory-maps a prepared PPM as a (height, width, 3) uint8 array; pages load on demand."""
+    import numpy as np
+
+    # The pixel data is the last width*height*3 bytes, after the text header
+    offset = os.path.getsize(ppm_path) - width * height * 3
+    return np.memmap(ppm_path, dtype=np.uint8, mode="r", offset=offset, shape=(height, width, 3))
+
+def _link_or_copy(src_path, dst_path):
+    # A hard link pins the cache entry for this render even if it is evicted meanwhile
+    try:
+        os.link(src_path, dst_path)
+    except OSError:
+        shutil.copyfile(src_path, dst_path)
+    return dst_path
+
+def _render_slideshow_ffmpeg(image_paths, audio_path, output_path, progress=None, profile=None):
+    """
+    Renders a slideshow with ffmpeg directly: every image comes pre-scaled/padded
+    to the canvas from the image cache, the concat demuxer holds each still for its
+    share of the audio (rounded to whole output frames) and the fps filter repeats
+    it up to the output frame rate.
+    """
+    _require_ffmpeg(encoders=("libx264", "aac"), filters=("fps", "tpad"))
+    total_duration = ffmpeg_tools.probe_media(audio_path)["duration"]
+    if not total_duration:
+        raise ValueError(f"Could not read audio duration: {audio_path}")
+    profile = profile or get_profile()
+    width, height = _slideshow_canvas(image_paths, profile)
+    out_fps = _output_fps(profile, SLIDESHOW_FPS)
+    total_frames = int(round(total_duration * out_fps))
+    # Image i covers output frames [bounds[i], bounds[i + 1])
+    bounds = [round(i * total_frames / len(image_paths)) for i in range(len(image_paths) + 1)]
+
+    work_dir = _make_workspace("slideshow-")
+    try:
+        # 1. Canvas-sized frames from the image cache (letterboxed, centered)
+        frames = []
+        for i, img_path in enumerate(image_paths):
+            frame_path = os.path.join(work_dir, f"frame_{i:04d}.ppm")
+            frames.append(_link_or_copy(prepare_image(img_path, width, height), frame_path))
+
+        # 2. Encode (segment-parallel for long voiceovers), no per-frame Python compositing.
+        # Each segment gets its own concat list of the stills it covers, starting with
+        # the one already showing, each for a whole number of output frames. The last
+        # still has no successor to end it, so tpad clones it and -frames:v (set by
+        # _encode_timeline) cuts the stream at exactly the right length.
+        def video_args(seg_start, seg_len):
+            first = int(round(seg_start * out_fps))
+            last = first + int(round(seg_len * out_fps))
+            list_path = os.path.join(work_dir, f"slides_{first:08d}.txt")
+            with open(list_path, "w", encoding="utf-8") as f:
+                f.write("ffconcat version 1.0\n")
+                for i, frame_path in enumerate(frames):
+                    n_frames = min(bounds[i + 1], last) - max(bounds[i], first)
+                    if n_frames > 0:
+                        f.write(f"file '{os.path.basename(frame_path)}'\nduration {n_frames / out_fps:.6f}\n")
+            inputs = ["-f", "concat", "-safe", "0", "-i", list_path]
+            outputs = ["-map", "0:v:0", "-vf", f"fps={out_fps},tpad=stop_mode=clone:stop_duration={seg_len:.6f}"]
+            return inputs, outputs
+
+        def audio_args(index):
+            return ["-i", audio_path], ["-map", f"{index}:a:0"]
+
+        _encode_timeline(video_args, audio_args, total_duration, SLIDESHOW_FPS, output_path, profile,
+                         progress, extra_video_args=["-tune", "stillimage"])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return output_path
+
+def _create_video_into(output_path, workspace, image_paths, audio_path, progress, use_ffmpeg, profile):
+    """Renders create_video's output to output_path (inside workspace)."""
+    if isinstance(image_paths, str):
+        image_paths = [image_paths]
+    
+    if use_ffmpeg and image_paths:
+        try:
+            return _render_slideshow_ffmpeg(image_paths, audio_path, output_path, progress, profile)
+        except RenderCancelled:
+            raise
+        except Exception as e:
+            print(f"ffmpeg slideshow failed: {e}. Falling back to MoviePy...")
     
     try:
-        # Load audio to get duration
-        audio = AudioFileClip(audio_path)
-        total_duration = audio.duration
-        
-        # Determine image inputs
-        if isinstance(image_paths, str):
-            image_paths = [image_paths]
+        mp = _load_moviepy()
+        # Load audio to get duration (its reader is closed when the block exits)
+        with open_clip("audio", audio_path) as audio:
+            total_duration = audio.duration
             
-        if not image_paths:
-            raise ValueError("No images provided for video creation.")
+            # Determine image inputs
+            if isinstance(image_paths, str):
+                image_paths = [image_paths]
+                
+            if not image_paths:
+                raise ValueError("No images provided for video creation.")
+                
+            # Calculate duration per image
+            duration_per_image = total_duration / len(image_paths)
             
-        # Calculate duration per image
-        duration_per_image = total_duration / len(image_paths)
-        
-        clips = []
-        for img_path in image_paths:
-            clip = ImageClip(img_path).with_duration(duration_per_image)
-            clips.append(clip)
+            # Memory-mapped frames from the image cache; raw files if preparing them fails
+            try:
+                width, height = _slideshow_canvas(image_paths, profile)
+                frames = [load_prepared_image(prepare_image(img_path, width, height), width, height)
+                          for img_path in image_paths]
+            except Exception as e:
+                print(f"Image preparation failed: {e}. Using the original files...")
+                frames = image_paths
             
-        # Concatenate clips
-        final_video = concatenate_videoclips(clips, method="compose")
-        
-        # Set audio to clip
-        final_video = final_video.with_audio(audio)
-        
-        # Write file (low preset for speed, 24fps)
-        # Using libx264 for high compatibility
-        final_video.write_videofile(output_path, fps=24, codec="libx264", audio_codec="aac", temp_audiofile='temp-audio.m4a', remove_temp=True)
-        
-        return output_path
+            clips = []
+            for frame in frames:
+                clip = mp.ImageClip(frame).with_duration(duration_per_image)
+                clips.append(clip)
+                
+            # Concatenate clips
+            final_video = mp.concatenate_videoclips(clips, method="compose")
+            
+            # Set audio to clip
+            final_video = _cap_clip_height(final_video.with_audio(audio), profile)
+            
+            # Write file with the profile's preset/CRF/fps
+            # Using libx264 for high compatibility
+            final_video.write_videofile(output_path, temp_audiofile=os.path.join(workspace, 'temp-audio.m4a'), remove_temp=True, logger=_moviepy_logger(progress), **_moviepy_write_kwargs(profile))
+            
+            return output_path
     except Exception as e:
         import traceback
         error_msg = f"Error creating video: {e}\n{traceback.format_exc()}"
         print(error_msg)
         raise Exception(error_msg)
 
-        raise Exception(error_msg)
+def create_video(image_paths, audio_path, output_filename, progress=None, use_ffmpeg=True, profile=DEFAULT_PROFILE):
+    """
+    Creates a video by merging image(s) and an audio file.
+    If multiple images are provided, they are displayed sequentially.
+    The total video duration matches the audio duration.
+    Renders with ffmpeg directly by default; MoviePy is the fallback.
+    """
+    profile = get_profile(profile)
+    output_dir = "content/videos"
+    output_path = os.path.join(output_dir, f"{output_filename}.mp4")
+    return _render_and_publish(output_path, "slideshow-", lambda work_output, workspace: _create_video_into(
+        work_output, workspace, image_paths, audio_path, progress, use_ffmpeg, profile))
 
+def get_proxy_cache():
+    global _proxy_cache
+    if _proxy_cache is None:
+        _proxy_cache = DiskCache(PROXY_CACHE_DIR, PROXY_CACHE_MAX_MB * 1024 * 1024)
+    return _proxy_cache
 
-def process_video(video_path, start_time=0, end_time=None, text_overlay=None, speed=1.0, output_filename="edited_video"):
+def make_proxy(video_path):
     """
-    Process an existing video: Trim, Speed, Text Overlay
+    Returns a low-resolution, low-fps copy of video_path for previews.
+    Built once per source version (path, size, mtime) and cached.
     """
-    output_dir = "content/videos/edited"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        
-    output_path = os.path.join(output_dir, f"{output_filename}.mp4")
+    stat = os.stat(video_path)
+    cache = get_proxy_cache()
+    key = make_key("proxy", os.path.abspath(video_path), stat.st_size, stat.st_mtime, PROXY_HEIGHT, PROXY_FPS)
+    cached_path = cache.get(key)
+    if cached_path:
+        return cached_path
+
+    _require_ffmpeg(encoders=("libx264", "aac"), filters=("scale",))
+    tmp_path = cache.temp_path(".mp4")
+    try:
+        ffmpeg_tools.run_ffmpeg([
+            "-i", video_path,
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-vf", f"scale=-2:'min(ih,{PROXY_HEIGHT})'",
+            "-c:v", "libx264", "-preset", "ultrafast", "-crf", "32", "-pix_fmt", "yuv420p",
+            "-r", str(PROXY_FPS),
+            "-c:a", "aac", "-b:a", "64k",
+            "-movflags", "+faststart",
+            tmp_path,
+        ])
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return cache.put(key, tmp_path, suffix=".mp4", move=True, meta={"source": video_path})
+
+def plan_edit(video_info, keyframes, start_time, end_time, text_overlay=None, speed=1.0, profile=None):
+    """
+    Picks the cheapest way to apply an edit:
+    'copy' (pure trim starting on a keyframe), 'smartcut' (pure trim, re-encode only
+    the partial GOPs at the ends) or 'transcode' (overlay/speed/other codecs).
+    """
+    profile = profile or get_profile()
+    if text_overlay or speed != 1.0:
+        return "transcode"
+    if video_info["video_codec"] not in STREAM_COPY_VIDEO_CODECS:
+        return "transcode"
+    if profile["max_height"] and (video_info["height"] or 0) > profile["max_height"]:
+        return "transcode"
+    frame = 1.0 / (video_info["fps"] or SLIDESHOW_FPS)
+    if start_time <= frame / 2 or any(abs(k - start_time) <= frame / 2 for k in keyframes):
+        return "copy"
+    # Smart-cut needs a keyframe inside the range to copy from
+    if any(start_time < k < end_time for k in keyframes):
+        return "smartcut"
+    return "transcode"
+
+def _x264_args_like(video_path, video_info, profile):
+    """
+    x264 arguments that reproduce video_path's SPS/PPS, built from the settings its
+    encoder recorded (x264 writes them into the first frame). Returns None for
+    sources whose parameter sets we cannot reproduce.
+    """
+    options = ffmpeg_tools.x264_options(video_path)
+    # Open-GOP keyframes are not cut points (their leading frames reference the previous GOP)
+    if not options or options.get("interlaced", "0") != "0" or options.get("open_gop", "0") != "0":
+        return None
+    units = dict(ffmpeg_tools.h264_parameter_sets(video_path))
+    sps = dict(units.get("Sequence Parameter Set", []))
+    h264_profile = H264_PROFILES.get(int(sps.get("profile_idc", 0)))
+    rate_control = {"crf": "crf", "cqp": "qp", "abr": "bitrate"}.get(options.get("rc"))
+    if not h264_profile or not rate_control or rate_control not in options:
+        return None
+
+    # The recorded chroma_qp_offset already includes x264's psy adjustment, which
+    # depends on the preset; with psy off it is written to the PPS unchanged
+    params = [f"{rate_control}={options[rate_control]}", "psy=0"]
+    for name, param in X264_HEADER_OPTIONS.items():
+        if name in options:
+            value = options[name]
+            if name == "b_pyramid":
+                value = ("none", "strict", "normal")[int(value)]
+            # -x264-params separates options with ':', x264 also accepts ',' inside values
+            value = value.replace(":", ",")
+            params.append(f"{param}={value}")
+    level = int(sps.get("level_idc", 0))
+    return ["-c:v", "libx264", "-preset", profile["preset"], "-threads", str(profile["threads"]),
+            "-profile:v", h264_profile, "-level", f"{level // 10}.{level % 10}", "-pix_fmt", "yuv420p",
+            "-r", str(video_info["fps"] or SLIDESHOW_FPS), "-x264-params", ":".join(params)]
+
+def _smart_cut(video_path, output_path, start_time, end_time, video_info, keyframes, profile):
+    """
+    Frame-accurate trim that only re-encodes the GOP fragments at the boundaries:
+    [start, first keyframe) and [last keyframe, end) are encoded, the middle is copied,
+    the pieces are joined with the concat demuxer and the audio is muxed once.
+
+    The MP4 keeps only the first piece's SPS/PPS, so the boundaries are encoded with
+    the source's own x264 settings and must come out with exactly the source's
+    parameter sets; the joined file is then decoded in full and its frame count
+    checked. Anything else raises, and the caller falls back to a transcode.
+    """
+    encode_args = _x264_args_like(video_path, video_info, profile)
+    if encode_args is None:
+        raise Exception("Source is not an x264 stream smart-cut can match")
+    source_sets = ffmpeg_tools.h264_parameter_sets(video_path)
+    inner = [k for k in keyframes if start_time < k < end_time]
+    first_key, last_key = inner[0], inner[-1]
+    fps = video_info["fps"] or SLIDESHOW_FPS
+    common = ["-an", "-video_track_timescale", "90000"]
+
+    work_dir = _make_workspace("smartcut-")
+    try:
+        segments = []
+        expected_frames = 0
+        pieces = [
+            (start_time, first_key, encode_args),
+            (first_key, last_key, ["-c:v", "copy"]),
+            (last_key, end_time, encode_args),
+        ]
+        for i, (seg_start, seg_end, codec_args) in enumerate(pieces):
+            n_frames = int(round((seg_end - seg_start) * fps))
+            if n_frames <= 0:
+                continue
+            seg_path = os.path.join(work_dir, f"seg_{i}.mp4")
+            ffmpeg_tools.run_ffmpeg([
+                "-ss", f"{seg_start:.6f}", "-i", video_path,
+                "-map", "0:v:0", *codec_args, "-frames:v", str(n_frames), *common, seg_path,
+            ])
+            if codec_args is encode_args and ffmpeg_tools.h264_parameter_sets(seg_path) != source_sets:
+                raise Exception("Re-encoded boundary does not match the source's SPS/PPS")
+            segments.append(seg_path)
+            expected_frames += n_frames
+
+        list_path = os.path.join(work_dir, "segments.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for seg_path in segments:
+                f.write(f"file '{os.path.basename(seg_path)}'\n")
+        video_only = os.path.join(work_dir, "video.mp4")
+        ffmpeg_tools.run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", video_only])
+
+        ffmpeg_tools.run_ffmpeg([
+            "-i", video_only,
+            "-ss", f"{start_time:.6f}", "-t", f"{end_time - start_time:.6f}", "-i", video_path,
+            "-map", "0:v:0", "-map", "1:a:0?",
+            "-c:v", "copy", *_audio_encode_args(profile), *_metadata_args(profile),
+            "-movflags", "+faststart",
+            output_path,
+        ])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    decoded = ffmpeg_tools.decode_check(output_path)
+    if decoded != expected_frames:
+        raise Exception(f"Smart-cut output decodes to {decoded} frames, expected {expected_frames}")
+    return output_path
+
+def _edit_range(info, start_time, end_time):
+    """Clamps a trim range like the MoviePy path does (invalid ranges keep the whole video)."""
+    if end_time is None or end_time == 0:
+        end_time = info["duration"]
+    start_time = max(0, start_time)
+    end_time = min(info["duration"], end_time)
+    if start_time >= end_time:
+        start_time, end_time = 0, info["duration"]
+    return start_time, end_time
+
+def _trim_without_transcode(video_path, output_path, start_time, end_time, text_overlay, speed, profile):
+    """
+    Applies a pure trim with stream copy or smart-cut when the edit allows it.
+    Returns the output path, or None if a full transcode is needed.
+    """
+    if text_overlay or speed != 1.0:
+        return None
+    info = ffmpeg_tools.probe_media(video_path)
+    if not info["duration"]:
+        return None
+    start_time, end_time = _edit_range(info, start_time, end_time)
+    keyframes = ffmpeg_tools.keyframe_times(video_path)
+    plan = plan_edit(info, keyframes, start_time, end_time, text_overlay, speed, profile)
+    if plan == "copy":
+        ffmpeg_tools.run_ffmpeg([
+            "-ss", f"{start_time:.6f}", "-i", video_path, "-t", f"{end_time - start_time:.6f}",
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-c", "copy", "-avoid_negative_ts", "make_zero", *_metadata_args(profile),
+            "-movflags", "+faststart",
+            output_path,
+        ])
+        return output_path
+    if plan == "smartcut" and ffmpeg_tools.has_encoder("libx264"):
+        return _smart_cut(video_path, output_path, start_time, end_time, info, keyframes, profile)
+    return None
+
+def get_overlay_cache():
+    global _overlay_cache
+    if _overlay_cache is None:
+        _overlay_cache = DiskCache(OVERLAY_CACHE_DIR, OVERLAY_CACHE_MAX_MB * 1024 * 1024)
+    return _overlay_cache
+
+def _load_font(size):
+    from PIL import ImageFont
+    for name in (OVERLAY_FONT,) + OVERLAY_FONT_FALLBACKS:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+def rasterize_text_overlay(text_overlay):
+    """
+    Renders a text overlay dict ({'text', 'fontsize', 'color'}) to a tightly cropped
+    RGBA PNG. Cached by text/font/size/color/stroke, so each overlay is drawn once.
+    """
+    from PIL import Image, ImageDraw
+
+    text = text_overlay['text']
+    size = int(text_overlay.get('fontsize', 50))
+    color = text_overlay.get('color', 'white')
+    cache = get_overlay_cache()
+    key = make_key("overlay", text, OVERLAY_FONT, size, color, OVERLAY_STROKE_COLOR, OVERLAY_STROKE_WIDTH)
+    cached_path = cache.get(key)
+    if cached_path:
+        return cached_path
+
+    font = _load_font(size)
+    probe = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    left, top, right, bottom = probe.textbbox((0, 0), text, font=font, stroke_width=OVERLAY_STROKE_WIDTH)
+    image = Image.new("RGBA", (max(1, right - left), max(1, bottom - top)), (0, 0, 0, 0))
+    ImageDraw.Draw(image).text((-left, -top), text, font=font, fill=color,
+                               stroke_width=OVERLAY_STROKE_WIDTH, stroke_fill=OVERLAY_STROKE_COLOR)
+    tmp_path = cache.temp_path(".png")
+    image.save(tmp_path)
+    return cache.put(key, tmp_path, suffix=".png", move=True)
+
+def _overlay_xy(position):
+    if isinstance(position, (tuple, list)):
+        return str(position[0]), str(position[1])
+    return OVERLAY_POSITIONS.get(position, OVERLAY_POSITIONS["center"])
+
+def _atempo_chain(speed):
+    """atempo only accepts 0.5-2.0 per instance, so chain it for larger changes."""
+    factors = []
+    while speed > 2.0:
+        factors.append(2.0)
+        speed /= 2.0
+    while speed < 0.5:
+        factors.append(0.5)
+        speed /= 0.5
+    factors.append(speed)
+    return ",".join(f"atempo={f:.6f}" for f in factors)
+
+def _transcode_edit(video_path, output_path, start_time, end_time, text_overlay, speed, profile, progress=None):
+    """
+    Full edit with ffmpeg: the overlay PNG is burned in with the overlay filter
+    (no per-frame Python compositing), speed uses setpts/atempo.
+    """
+    info = ffmpeg_tools.probe_media(video_path)
+    if not info["duration"]:
+        raise ValueError(f"Could not read video duration: {video_path}")
+    needed_filters = ["setpts", "fps", "trim", "tpad"]
+    if text_overlay:
+        needed_filters.append("overlay")
+    if speed != 1.0:
+        needed_filters.append("atempo")
+    if profile["max_height"]:
+        needed_filters.append("scale")
+    _require_ffmpeg(encoders=("libx264", "aac"), filters=needed_filters)
+    start_time, end_time = _edit_range(info, start_time, end_time)
+    output_duration = (end_time - start_time) / speed
+    overlay_path = rasterize_text_overlay(text_overlay) if text_overlay else None
+    out_fps = _output_fps(profile, info["fps"])
+
+    def video_args(seg_start, seg_len):
+        inputs, chain = _timeline_segment(video_path, start_time, speed, out_fps, seg_start, seg_len)
+        filters = [f"[0:v]{chain}[base]"]
+        label = "[base]"
+        if overlay_path:
+            inputs += ["-i", overlay_path]
+            x, y = _overlay_xy(text_overlay.get('position', 'center'))
+            filters.append(f"{label}[1:v]overlay=x={x}:y={y}[ov]")
+            label = "[ov]"
+        if profile["max_height"]:
+            filters.append(f"{label}scale=-2:'min(ih,{profile['max_height']})'[vout]")
+            label = "[vout]"
+        return inputs, ["-filter_complex", ";".join(filters), "-map", label]
+
+    def audio_args(index):
+        if not info["audio_codec"]:
+            return [], []
+        inputs = ["-ss", f"{start_time:.6f}", "-t", f"{end_time - start_time:.6f}", "-i", video_path]
+        maps = ["-map", f"{index}:a:0"]
+        if speed != 1.0:
+            maps += ["-af", _atempo_chain(speed)]
+        return inputs, maps
+
+    return _encode_timeline(video_args, audio_args, output_duration, info["fps"], output_path, profile, progress)
+
+def _process_video_into(output_path, workspace, video_path, start_time, end_time, text_overlay, speed, progress, profile):
+    """Renders process_video's output to output_path (inside workspace)."""
+    # Cut-only edits skip the decode/encode entirely (or re-encode just the boundary GOPs)
+    try:
+        if _trim_without_transcode(video_path, output_path, start_time, end_time, text_overlay, speed, profile):
+            return output_path
+    except Exception as e:
+        print(f"Fast trim failed: {e}. Falling back to full render...")
     
     try:
-        from moviepy.editor import TextClip, CompositeVideoClip, vfx
+        return _transcode_edit(video_path, output_path, start_time, end_time, text_overlay, speed, profile, progress)
+    except RenderCancelled:
+        raise
+    except Exception as e:
+        print(f"ffmpeg edit failed: {e}. Falling back to MoviePy...")
+    
+    try:
+        mp = _load_moviepy()
         
-        clip = VideoFileClip(video_path)
+        # The source reader is closed when the block exits, even on error
+        with open_clip("video", video_path) as source:
+            clip = source
         
-        # 1. Trim
-        if end_time is None or end_time == 0:
-            end_time = clip.duration
+            # 1. Trim
+            if end_time is None or end_time == 0:
+                end_time = clip.duration
         
-        # Ensure times are valid
-        start_time = max(0, start_time)
-        end_time = min(clip.duration, end_time)
+            # Ensure times are valid
+            start_time = max(0, start_time)
+            end_time = min(clip.duration, end_time)
         
-        if start_time < end_time:
-            clip = clip.subclipped(start_time, end_time)
+            if start_time < end_time:
+                clip = clip.subclipped(start_time, end_time)
             
-        # 2. Speed
-        if speed != 1.0:
-            clip = clip.with_effects([vfx.MultiplySpeed(speed)])
+            # 2. Speed
+            if speed != 1.0:
+                clip = clip.with_effects([mp.vfx.MultiplySpeed(speed)])
             
-        # 3. Text Overlay
-        if text_overlay:
-            # text_overlay is a dict: {'text': str, 'fontsize': int, 'color': str, 'position': str/tuple}
-            txt_clip = TextClip(
-                text=text_overlay['text'],
-                font='Arial', 
-                font_size=text_overlay.get('fontsize', 50),
-                color=text_overlay.get('color', 'white'),
-                stroke_color='black',
-                stroke_width=2
-            )
+            # 3. Text Overlay
+            if text_overlay:
+                # text_overlay is a dict: {'text': str, 'fontsize': int, 'color': str, 'position': str/tuple}
+                txt_clip = mp.TextClip(
+                    text=text_overlay['text'],
+                    font='Arial', 
+                    font_size=text_overlay.get('fontsize', 50),
+                    color=text_overlay.get('color', 'white'),
+                    stroke_color='black',
+                    stroke_width=2
+                )
             
-            pos = text_overlay.get('position', 'center')
-            txt_clip = txt_clip.with_position(pos).with_duration(clip.duration)
+                pos = text_overlay.get('position', 'center')
+                txt_clip = txt_clip.with_position(pos).with_duration(clip.duration)
             
-            clip = CompositeVideoClip([clip, txt_clip])
+                clip = mp.CompositeVideoClip([clip, txt_clip])
             
-        # Write file
-        clip.write_videofile(output_path, fps=24, codec="libx264", audio_codec="aac", temp_audiofile='temp-edit-audio.m4a', remove_temp=True)
+            # Write file
+            clip = _cap_clip_height(clip, profile)
+            clip.write_videofile(output_path, temp_audiofile=os.path.join(workspace, 'temp-audio.m4a'), remove_temp=True, logger=_moviepy_logger(progress), **_moviepy_write_kwargs(profile))
         
-        return output_path
+            return output_path
         
     except Exception as e:
         import traceback
         error_msg = f"Error processing video: {e}\n{traceback.format_exc()}"
         print(error_msg)
         raise Exception(error_msg)
+
+def process_video(video_path, start_time=0, end_time=None, text_overlay=None, speed=1.0, output_filename="edited_video", progress=None, profile=DEFAULT_PROFILE, preview=False):
+    """
+    Process an existing video: Trim, Speed, Text Overlay
+    With preview=True the edit is rendered against a cached low-res proxy with the
+    draft profile (into content/videos/previews) for fast iteration.
+    """
+    output_dir = "content/videos/edited"
+    if preview:
+        source_height = ffmpeg_tools.probe_media(video_path)["height"]
+        video_path = make_proxy(video_path)
+        proxy_height = ffmpeg_tools.probe_media(video_path)["height"]
+        if text_overlay and source_height and proxy_height:
+            # Keep the overlay the same size relative to the frame
+            text_overlay = dict(text_overlay)
+            text_overlay['fontsize'] = max(8, round(text_overlay.get('fontsize', 50) * proxy_height / source_height))
+        profile = "draft"
+        output_dir = "content/videos/previews"
+    profile = get_profile(profile)
+    output_path = os.path.join(output_dir, f"{output_filename}.mp4")
+    return _render_and_publish(output_path, "edit-", lambda work_output, workspace: _process_video_into(
+        work_output, workspace, video_path, start_time, end_time, text_overlay, speed, progress, profile))
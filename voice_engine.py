@@ -1,6 +1,8 @@
-import edge_tts
 import asyncio
 import os
+import re
+import shutil
+from disk_cache import DiskCache, make_key
 
 # Available high-quality voices (Microsoft Edge Neural)
 VOICES = {
@@ -14,23 +16,299 @@ VOICES = {
     "Afaan Oromo (Male)": "am-ET-AmehaNeural"
 }
 
-async def generate_speech(text, voice, output_path, rate="+0%", pitch="+0Hz"):
-    """Generates an MP3 file from text using edge-tts."""
+# Synthesized MP3s are reused when text, voice, rate and pitch match
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "content/cache/tts")
+TTS_CACHE_MAX_MB = int(os.environ.get("TTS_CACHE_MAX_MB", "500"))
+
+_tts_cache = None
+
+def get_tts_cache():
+    global _tts_cache
+    if _tts_cache is None:
+        _tts_cache = DiskCache(TTS_CACHE_DIR, TTS_CACHE_MAX_MB * 1024 * 1024)
+    return _tts_cache
+
+def normalize_text(text):
+    """Collapses whitespace so cosmetic edits don't miss the cache."""
+    return " ".join(text.split())
+
+# Long scripts are split and synthesized concurrently
+CHUNK_MAX_CHARS = 1500
+CHUNKED_MIN_CHARS = 2000
+MAX_CONCURRENT_CHUNKS = 4
+CHUNK_RETRIES = 3
+
+def tts_cache_key(text, voice, rate="+0%", pitch="+0Hz"):
+    return make_key("tts", normalize_text(text), voice, rate, pitch)
+
+def _make_communicate(text, voice, rate, pitch):
+    """Creates an edge-tts request that reports word boundaries when the library supports it."""
+    import edge_tts
     try:
-        communicate = edge_tts.Communicate(text, voice, rate=rate, pitch=pitch)
-        await communicate.save(output_path)
+        return edge_tts.Communicate(text, voice, rate=rate, pitch=pitch, boundary="WordBoundary")
+    except TypeError:
+        # Older edge-tts versions always emit WordBoundary events
+        return edge_tts.Communicate(text, voice, rate=rate, pitch=pitch)
+
+async def stream_speech(text, voice, output_path, rate="+0%", pitch="+0Hz"):
+    """
+    Async generator over a synthesis: audio is appended to output_path + '.part' as it
+    arrives and renamed to output_path once the synthesis has finished, so a failed or
+    abandoned run never leaves a partial MP3 at output_path.
+    Yields {'type': 'audio', 'bytes_written', 'path'} after each audio chunk ('path' is
+    the growing .part file) and {'type': 'WordBoundary'/'SentenceBoundary', 'offset',
+    'duration', 'text'} events (offset/duration in seconds).
+    """
+    communicate = _make_communicate(text, voice, rate, pitch)
+    tmp_path = f"{output_path}.part"
+    bytes_written = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    f.write(chunk["data"])
+                    f.flush()
+                    bytes_written += len(chunk["data"])
+                    yield {"type": "audio", "bytes_written": bytes_written, "path": tmp_path}
+                elif chunk["type"] in ("WordBoundary", "SentenceBoundary"):
+                    # edge-tts reports offsets in 100ns ticks
+                    yield {
+                        "type": chunk["type"],
+                        "offset": chunk["offset"] / 10_000_000,
+                        "duration": chunk["duration"] / 10_000_000,
+                        "text": chunk["text"],
+                    }
+        if not bytes_written:
+            raise Exception("edge-tts returned no audio")
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+async def generate_speech(text, voice, output_path, rate="+0%", pitch="+0Hz", boundaries=None):
+    """Generates an MP3 file from text using edge-tts. Boundary events are appended to `boundaries` if given."""
+    try:
+        async for event in stream_speech(text, voice, output_path, rate, pitch):
+            if boundaries is not None and event["type"] != "audio":
+                boundaries.append(event)
         return True
     except Exception as e:
         print(f"Error generating speech: {e}")
         return False
 
-def run_tts(text, voice_key, filename, rate="+0%", pitch="+0Hz"):
-    """Wrapper to run the async generator."""
+def boundaries_to_srt(boundaries, max_words=8):
+    """Groups word/sentence boundary events into SRT subtitle text."""
+    def fmt(seconds):
+        ms = int(round(seconds * 1000))
+        hours, ms = divmod(ms, 3_600_000)
+        minutes, ms = divmod(ms, 60_000)
+        secs, ms = divmod(ms, 1000)
+        return f"{hours:02}:{minutes:02}:{secs:02},{ms:03}"
+
+    cues = []
+    group = []
+    for event in boundaries:
+        group.append(event)
+        if len(group) >= max_words or event["type"] == "SentenceBoundary" or event["text"].endswith((".", "!", "?")):
+            cues.append(group)
+            group = []
+    if group:
+        cues.append(group)
+
+    lines = []
+    for i, cue in enumerate(cues, 1):
+        start = cue[0]["offset"]
+        end = cue[-1]["offset"] + cue[-1]["duration"]
+        lines.append(f"{i}\n{fmt(start)} --> {fmt(end)}\n{' '.join(e['text'] for e in cue)}\n")
+    return "\n".join(lines)
+
+def _save_subtitles(boundaries, srt_path):
+    """Writes boundaries as an .srt (removing a stale one if there are none); returns its path or None."""
+    if not boundaries:
+        if os.path.exists(srt_path):
+            os.remove(srt_path)
+        return None
+    with open(srt_path, "w", encoding="utf-8") as f:
+        f.write(boundaries_to_srt(boundaries))
+    return srt_path
+
+def _cache_voice(cache, key, output_path, boundaries):
+    # Word timings are kept with the MP3 so a cache hit still gets its subtitles
+    cache.put(key, output_path, suffix=".mp3", meta={"boundaries": boundaries} if boundaries else None)
+
+def _cached_voice(cache, key, output_path):
+    """Copies a cached MP3 to output_path; returns its stored boundaries ([] if none), or None on a miss."""
+    cached_path = cache.get(key)
+    if not cached_path:
+        return None
+    shutil.copyfile(cached_path, output_path)
+    return (cache.get_meta(key) or {}).get("boundaries", [])
+
+def split_text(text, max_chars=CHUNK_MAX_CHARS):
+    """
+    Splits text into chunks of at most max_chars, breaking at paragraph
+    and then sentence boundaries. A single overlong sentence is split on spaces.
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            sentence = sentence.strip()
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                if cut <= 0:
+                    cut = max_chars
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:].strip()
+            if sentence:
+                pieces.append(sentence)
+        # Empty marker keeps paragraph breaks as preferred chunk boundaries
+        pieces.append("")
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if not piece:
+            if len(current) >= max_chars // 2:
+                chunks.append(current)
+                current = ""
+            continue
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+async def _synthesize_chunk(text, voice, rate, pitch):
+    """Synthesizes one chunk and returns the raw MP3 bytes."""
+    import edge_tts
+    communicate = edge_tts.Communicate(text, voice, rate=rate, pitch=pitch)
+    audio = bytearray()
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            audio.extend(chunk["data"])
+    if not audio:
+        raise Exception("edge-tts returned no audio")
+    return bytes(audio)
+
+async def generate_speech_chunked(text, voice, output_path, rate="+0%", pitch="+0Hz",
+                                  max_chars=CHUNK_MAX_CHARS, max_concurrency=MAX_CONCURRENT_CHUNKS,
+                                  retries=CHUNK_RETRIES):
+    """
+    Generates an MP3 file from a long text by synthesizing chunks concurrently.
+    Each chunk is retried on its own; segments are joined in order without re-encoding.
+    """
+    chunks = split_text(text, max_chars)
+    if not chunks:
+        return False
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def worker(chunk_text):
+        async with semaphore:
+            for attempt in range(retries):
+                try:
+                    return await _synthesize_chunk(chunk_text, voice, rate, pitch)
+                except Exception as e:
+                    if attempt == retries - 1:
+                        raise
+                    print(f"Chunk synthesis failed ({e}), retrying...")
+                    await asyncio.sleep(2 ** attempt)
+
+    tmp_path = f"{output_path}.part"
+    try:
+        segments = await asyncio.gather(*(worker(chunk_text) for chunk_text in chunks))
+        # MP3 is a frame stream, so segments from the same voice concatenate cleanly
+        with open(tmp_path, "wb") as f:
+            for segment in segments:
+                f.write(segment)
+        os.replace(tmp_path, output_path)
+        return True
+    except Exception as e:
+        print(f"Error generating speech: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+def run_tts(text, voice_key, filename, rate="+0%", pitch="+0Hz", use_cache=True):
+    """
+    Wrapper to run the async generator. Reuses a cached MP3 when one matches.
+    Word timings are saved as an .srt next to the audio when available.
+    Raises if the synthesis fails, so callers never mistake a missing or stale file for a result.
+    """
     voice = VOICES.get(voice_key, "en-US-AvaNeural")
     output_dir = "content/audio"
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
     output_path = os.path.join(output_dir, f"{filename}.mp3")
-    asyncio.run(generate_speech(text, voice, output_path, rate, pitch))
+    srt_path = os.path.join(output_dir, f"{filename}.srt")
+    
+    cache = get_tts_cache() if use_cache else None
+    key = tts_cache_key(text, voice, rate, pitch)
+    if cache:
+        boundaries = _cached_voice(cache, key, output_path)
+        if boundaries is not None:
+            _save_subtitles(boundaries, srt_path)
+            return output_path
+    
+    boundaries = []
+    if len(text) >= CHUNKED_MIN_CHARS:
+        # Chunks are synthesized without timings
+        ok = asyncio.run(generate_speech_chunked(text, voice, output_path, rate, pitch))
+    else:
+        ok = asyncio.run(generate_speech(text, voice, output_path, rate, pitch, boundaries=boundaries))
+    if not ok:
+        raise Exception(f"Voice generation failed for {filename}")
+    _save_subtitles(boundaries, srt_path)
+    if cache:
+        _cache_voice(cache, key, output_path, boundaries)
     return output_path
+
+def stream_tts(text, voice_key, filename, rate="+0%", pitch="+0Hz", use_cache=True):
+    """
+    Synchronous generator version of run_tts for progressive display.
+    Yields the stream_speech events while the MP3 is written, saves word timings as
+    an .srt next to the audio, and yields {'type': 'done', 'path', 'srt_path', 'cached'} last.
+    """
+    voice = VOICES.get(voice_key, "en-US-AvaNeural")
+    output_dir = "content/audio"
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    
+    output_path = os.path.join(output_dir, f"{filename}.mp3")
+    srt_path = os.path.join(output_dir, f"{filename}.srt")
+    
+    cache = get_tts_cache() if use_cache else None
+    key = tts_cache_key(text, voice, rate, pitch)
+    if cache:
+        boundaries = _cached_voice(cache, key, output_path)
+        if boundaries is not None:
+            yield {"type": "done", "path": output_path, "srt_path": _save_subtitles(boundaries, srt_path), "cached": True}
+            return
+    
+    boundaries = []
+    agen = stream_speech(text, voice, output_path, rate, pitch)
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                event = loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+            if event["type"] != "audio":
+                boundaries.append(event)
+            yield event
+    finally:
+        loop.run_until_complete(agen.aclose())
+        loop.close()
+    
+    srt_path = _save_subtitles(boundaries, srt_path)
+    if cache:
+        _cache_voice(cache, key, output_path, boundaries)
+    yield {"type": "done", "path": output_path, "srt_path": srt_path, "cached": False}